@@ -1,5 +1,7 @@
 from pymongo import MongoClient
-from typing import Dict, List
+from pymongo.client_session import ClientSession
+from bson.codec_options import CodecOptions
+from typing import Dict, List, Optional
 
 
 class MongoDBConnection:
@@ -7,12 +9,13 @@ class MongoDBConnection:
     This class handles the connection to the database and provides methods to interact with collections and documents.  
     """ 
 
-    def __init__(self, uri: str):
+    def __init__(self, uri: str, event_listeners: Optional[list] = None):
         """ 
         Constructor function to initialize the database connection.  
         
         Args:  
             uri (str): The connection string URI for the MongoDB database.  
+            event_listeners (Optional[list]): pymongo monitoring listeners, e.g. a CommandLatencyMonitor. Defaults to None.  
         
         Returns:  
             None  
@@ -20,7 +23,8 @@ class MongoDBConnection:
         self.uri = uri
 
         try:
-            self.client = MongoClient(self.uri)
+            self.client = MongoClient(
+                self.uri, event_listeners=event_listeners or [])
         except Exception as e:
             raise Exception(
                 "The following error occurred: ", e)
@@ -48,20 +52,34 @@ class MongoDBConnection:
         database = self.client[db_name]
         return database
 
-    def get_collection(self, db_name: str, collection_name: str):
+    def get_collection(self, db_name: str, collection_name: str, codec_options: Optional[CodecOptions] = None,
+                       read_preference=None):
         """ 
         Retrieves a collection by name.  
         
         Args:  
             db_name (str): The name of the database.  
             collection_name (str): The name of the collection to retrieve.  
+            codec_options (Optional[CodecOptions]): Codec options for the collection, e.g. to return RawBSONDocument. Defaults to the client's.  
+            read_preference (Optional[_ServerMode]): The read preference for the collection. Defaults to the client's (primary).  
         
         Returns:  
             Collection: The collection instance corresponding to the provided names.  
         """  
-        collection = self.client[db_name][collection_name]
+        collection = self.client[db_name].get_collection(
+            collection_name, codec_options=codec_options, read_preference=read_preference)
         return collection
 
+    def start_causal_session(self) -> ClientSession:
+        """ 
+        Starts a causally consistent session, for read-your-writes flows.  
+        Reads issued in the session observe the session's earlier writes, even on secondaries.  
+        
+        Returns:  
+            ClientSession: The session, to be used as a context manager.  
+        """  
+        return self.client.start_session(causal_consistency=True)
+
     def insert_one(self, db_name: str, collection_name: str, document: Dict,
                    redefined_id: bool = False, id_attribute: str = None):
         """ 
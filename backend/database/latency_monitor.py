@@ -0,0 +1,51 @@
+from typing import Callable, Optional
+
+from pymongo import monitoring
+
+
+class CommandLatencyMonitor(monitoring.CommandListener):
+    """This class tracks exponentially weighted moving averages of MongoDB command latency.
+
+    One average covers all commands; with a key_source, another is kept per key, e.g.
+    per admission route group. Listeners run in the thread issuing the command, so the
+    key_source can read context variables of the request.
+
+    Register it with MongoDBConnection(uri, event_listeners=[monitor]).
+    """
+
+    def __init__(self, alpha: float = 0.2, key_source: Optional[Callable[[], Optional[str]]] = None):
+        """Initialize the monitor.
+
+        Args:
+            alpha (float): Weight of the newest sample in the moving average. Defaults to 0.2.
+            key_source (Optional[Callable[[], Optional[str]]]): Returns the key of the current command, or None.
+
+        Returns:
+            None
+        """
+        self.alpha = alpha
+        self.key_source = key_source
+        self.latency_ms = 0.0
+        self.latency_ms_by_key: dict[str, float] = {}
+
+    def latency_for(self, key: str) -> Optional[float]:
+        """Return the average latency of a key, or None if none of its commands completed yet."""
+        return self.latency_ms_by_key.get(key)
+
+    def _record(self, duration_micros: int):
+        sample_ms = duration_micros / 1000
+        # Single float and dict assignments, safe without a lock under the GIL
+        self.latency_ms += self.alpha * (sample_ms - self.latency_ms)
+        key = self.key_source() if self.key_source is not None else None
+        if key is not None:
+            previous = self.latency_ms_by_key.get(key, sample_ms)
+            self.latency_ms_by_key[key] = previous + self.alpha * (sample_ms - previous)
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event.duration_micros)
+
+    def failed(self, event):
+        self._record(event.duration_micros)
@@ -0,0 +1,38 @@
+from pymongo.read_preferences import (
+    Nearest,
+    Primary,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred,
+)
+
+_MODES = {
+    "primary": Primary,
+    "primarypreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondarypreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def read_preference_from_config(mode: str, max_staleness_seconds: int = -1):
+    """Build a read preference from its configuration values.
+
+    Args:
+        mode (str): The read preference mode, e.g. "primary" or "secondaryPreferred" (case-insensitive).
+        max_staleness_seconds (int): The maximum replication lag of eligible secondaries, at least 90. Defaults to -1 (no limit).
+
+    Returns:
+        _ServerMode: The read preference instance.
+
+    Raises:
+        ValueError: If the mode is unknown, or a staleness bound is given for the primary mode.
+    """
+    read_preference_class = _MODES.get(mode.replace("_", "").lower())
+    if read_preference_class is None:
+        raise ValueError(f"Unknown read preference mode '{mode}'")
+    if read_preference_class is Primary:
+        if max_staleness_seconds != -1:
+            raise ValueError("maxStalenessSeconds cannot be used with the primary read preference")
+        return Primary()
+    return read_preference_class(max_staleness=max_staleness_seconds)
@@ -0,0 +1,159 @@
+import re
+from datetime import datetime
+from typing import Any, Callable, Mapping
+
+from bson import Decimal128, ObjectId
+
+# Python types accepted for each $jsonSchema bsonType
+_BSON_TYPES = {
+    "string": (str,),
+    "double": (float,),
+    "int": (int,),
+    "long": (int,),
+    "decimal": (Decimal128,),
+    "number": (int, float, Decimal128),
+    "bool": (bool,),
+    "date": (datetime,),
+    "objectId": (ObjectId,),
+    "object": (Mapping,),
+    "array": (list, tuple),
+    "null": (type(None),),
+}
+
+# A compiled check: appends the errors of a value at a path to a list
+_Check = Callable[[Any, str, list], None]
+
+
+def _compile(schema: Mapping) -> _Check:
+    """Compile a $jsonSchema node into a list of checks, run in order."""
+    checks: list[_Check] = []
+
+    if "bsonType" in schema:
+        names = schema["bsonType"]
+        names = [names] if isinstance(names, str) else list(names)
+        types = tuple(t for name in names for t in _BSON_TYPES[name])
+        # bool is an int subclass, but never a valid number or int for BSON
+        allow_bool = "bool" in names
+
+        def check_type(value, path, errors, types=types, allow_bool=allow_bool, names=names):
+            if not isinstance(value, types) or (isinstance(value, bool) and not allow_bool):
+                errors.append(f"'{path}' must be of type {' or '.join(names)}")
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+
+        def check_enum(value, path, errors, allowed=allowed):
+            if value not in allowed:
+                errors.append(f"'{path}' must be one of {allowed}")
+        checks.append(check_enum)
+
+    if "pattern" in schema:
+        pattern = re.compile(schema["pattern"])
+
+        def check_pattern(value, path, errors, pattern=pattern):
+            if isinstance(value, str) and not pattern.search(value):
+                errors.append(f"'{path}' does not match the expected format")
+        checks.append(check_pattern)
+
+    if "required" in schema:
+        required = tuple(schema["required"])
+
+        def check_required(value, path, errors, required=required):
+            if isinstance(value, Mapping):
+                for name in required:
+                    if name not in value:
+                        errors.append(f"'{_join(path, name)}' is required")
+        checks.append(check_required)
+
+    if "properties" in schema:
+        properties = {name: _compile(sub) for name, sub in schema["properties"].items()}
+
+        def check_properties(value, path, errors, properties=properties):
+            if isinstance(value, Mapping):
+                for name, check in properties.items():
+                    if name in value:
+                        check(value[name], _join(path, name), errors)
+        checks.append(check_properties)
+
+    if "items" in schema:
+        check_item = _compile(schema["items"])
+
+        def check_items(value, path, errors, check_item=check_item):
+            if isinstance(value, (list, tuple)):
+                for index, item in enumerate(value):
+                    check_item(item, f"{path}.{index}", errors)
+        checks.append(check_items)
+
+    def check_all(value, path, errors, checks=tuple(checks)):
+        for check in checks:
+            check(value, path, errors)
+    return check_all
+
+
+def _join(path: str, name: str) -> str:
+    return f"{path}.{name}" if path else name
+
+
+class SchemaValidator:
+    """This class validates documents in-process against a collection's $jsonSchema.
+
+    The schema is compiled once into nested closures, so validating a document
+    only walks the document, not the schema definition. Supports the keywords
+    used by the leafy_bank schemas: bsonType, required, properties, enum, pattern
+    and items.
+    """
+
+    def __init__(self, json_schema: Mapping):
+        """Compile the schema.
+
+        Args:
+            json_schema (Mapping): The $jsonSchema document.
+
+        Returns:
+            None
+        """
+        self.json_schema = json_schema
+        self._check = _compile(json_schema)
+        # Checks of dotted field paths, compiled on first use
+        self._field_checks: dict[str, Any] = {}
+
+    def validate(self, document: Mapping) -> list[str]:
+        """Validate a full document.
+
+        Args:
+            document (Mapping): The document about to be inserted.
+
+        Returns:
+            list[str]: The validation errors, empty if the document is valid.
+        """
+        errors = []
+        self._check(document, "", errors)
+        return errors
+
+    def validate_fields(self, fields: Mapping[str, Any]) -> list[str]:
+        """Validate the fields of a $set update, keyed by dotted path.
+
+        Args:
+            fields (Mapping[str, Any]): The values about to be set, e.g. {"AccountDate.ClosingDate": now}.
+
+        Returns:
+            list[str]: The validation errors, empty if all values are valid.
+        """
+        errors = []
+        for path, value in fields.items():
+            check = self._field_check(path)
+            if check is not None:
+                check(value, path, errors)
+        return errors
+
+    def _field_check(self, path: str):
+        """Return the compiled check of a dotted field path, None if the schema does not describe it."""
+        if path not in self._field_checks:
+            schema = self.json_schema
+            for name in path.split("."):
+                schema = schema.get("properties", {}).get(name)
+                if schema is None:
+                    break
+            self._field_checks[path] = _compile(schema) if schema is not None else None
+        return self._field_checks[path]
@@ -0,0 +1,211 @@
+"""$jsonSchema definitions of the leafy_bank collections.
+
+Shared by the collection validator scripts, which install them on MongoDB, and by
+the services, which compile them with schema_validator to reject invalid writes
+before they reach the database.
+"""
+
+ACCOUNTS_JSON_SCHEMA = {
+    "bsonType": "object",
+    "title": "Account Object Validation",
+    "required": ["AccountNumber", "AccountBank", "AccountStatus", "AccountDate", "AccountType", "AccountBalance", "AccountCurrency", "AccountUser"],
+    "properties": {
+        "AccountNumber": {
+            "bsonType": "string",
+            "description": "'AccountNumber' must be a string and is required"
+        },
+        "AccountBank": {
+            "bsonType": "string",
+            "description": "'AccountBank' must be a string and is required"
+        },
+        "AccountStatus": {
+            "bsonType": "string",
+            "enum": ["Active", "Closed"],
+            "description": "'AccountStatus' must be either 'Active' or 'Closed' and is required"
+        },
+        "AccountIdentificationType": {
+            "bsonType": "string",
+            "description": "'AccountIdentificationType' must be a string"
+        },
+        "AccountDate": {
+            "bsonType": "object",
+            "required": ["OpeningDate"],
+            "properties": {
+                "OpeningDate": {
+                    "bsonType": "date",
+                    "description": "'OpeningDate' must be a date and is required"
+                },
+                "ClosingDate": {
+                    "bsonType": "date",
+                    "description": "'ClosingDate' must be a date if the field exists"
+                }
+            }
+        },
+        "AccountType": {
+            "bsonType": "string",
+            "enum": ["Checking", "Savings"],
+            "description": "'AccountType' must be either 'Checking' or 'Savings' and is required"
+        },
+        "AccountBalance": {
+            "bsonType": "double",
+            "description": "'AccountBalance' must be a double and is required"
+        },
+        "AccountCurrency": {
+            "bsonType": "string",
+            "description": "'AccountCurrency' must be a string and is required"
+        },
+        "AccountDescription": {
+            "bsonType": "string",
+            "description": "'AccountDescription' must be a string"
+        },
+        "LastModified": {
+            "bsonType": "date",
+            "description": "'LastModified' must be a date if the field exists"
+        },
+        "AccountUser": {
+            "bsonType": "object",
+            "required": ["UserName", "UserId"],
+            "properties": {
+                "UserName": {
+                    "bsonType": "string",
+                    "description": "'UserName' must be a string and is required"
+                },
+                "UserId": {
+                    "bsonType": "objectId",
+                    "description": "'UserId' must be an ObjectId and is required"
+                }
+            }
+        }
+    }
+}
+
+USERS_JSON_SCHEMA = {
+    "bsonType": "object",
+    "title": "User Object Validation",
+    "required": ["UserName", "UserEmail", "UserIdentification", "Name", "ResidentialStatus", "CivilStatus", "BirthDate", "Nationality", "JobTitle", "UserAddress"],
+    "properties": {
+        "UserName": {
+            "bsonType": "string",
+            "description": "'UserName' must be a string and is required"
+        },
+        "UserEmail": {
+            "bsonType": "string",
+            "pattern": r"^.+@.+\..+$",
+            "description": "'UserEmail' must be a valid email address and is required"
+        },
+        "UserIdentification": {
+            "bsonType": "string",
+            "description": "'UserIdentification' must be a string and is required"
+        },
+        "Name": {
+            "bsonType": "object",
+            "required": ["FirstName", "LastName", "NamePrefix"],
+            "properties": {
+                "FirstName": {
+                    "bsonType": "string",
+                    "description": "'FirstName' must be a string and is required"
+                },
+                "LastName": {
+                    "bsonType": "string",
+                    "description": "'LastName' must be a string and is required"
+                },
+                "NamePrefix": {
+                    "bsonType": "string",
+                    "description": "'NamePrefix' must be a string and is required"
+                }
+            }
+        },
+        "ResidentialStatus": {
+            "bsonType": "string",
+            "description": "'ResidentialStatus' must be a string and is required"
+        },
+        "CivilStatus": {
+            "bsonType": "string",
+            "description": "'CivilStatus' must be a string and is required"
+        },
+        "BirthDate": {
+            "bsonType": "date",
+            "description": "'BirthDate' must be a date and is required"
+        },
+        "Nationality": {
+            "bsonType": "string",
+            "description": "'Nationality' must be a string and is required"
+        },
+        "JobTitle": {
+            "bsonType": "string",
+            "description": "'JobTitle' must be a string and is required"
+        },
+        "UserAddress": {
+            "bsonType": "object",
+            "required": ["StreetAndNumber", "PostalCode", "City", "Country", "State"],
+            "properties": {
+                "StreetAndNumber": {
+                    "bsonType": "string",
+                    "description": "'StreetAndNumber' must be a string and is required"
+                },
+                "PostalCode": {
+                    "bsonType": "string",
+                    "description": "'PostalCode' must be a string and is required"
+                },
+                "City": {
+                    "bsonType": "string",
+                    "description": "'City' must be a string and is required"
+                },
+                "Country": {
+                    "bsonType": "string",
+                    "description": "'Country' must be a string and is required"
+                },
+                "State": {
+                    "bsonType": "string",
+                    "description": "'State' must be a string and is required"
+                }
+            }
+        },
+        "LinkedAccounts": {
+            "bsonType": "array",
+            "items": {
+                "bsonType": "objectId",
+                "description": "'LinkedAccounts' must be an array of ObjectIds"
+            },
+            "description": "'LinkedAccounts' must be an array of ObjectIds"
+        },
+        "RecentTransactions": {
+            "bsonType": "array",
+            "items": {
+                "bsonType": "object",
+                "description": "'RecentTransactions' must be an array of objects"
+            },
+            "description": "'RecentTransactions' must be an array of objects"
+        },
+        "SearchKeys": {
+            "bsonType": "array",
+            "items": {
+                "bsonType": "string",
+                "description": "'SearchKeys' must be an array of lowercase strings"
+            },
+            "description": "'SearchKeys' must be an array of lowercase strings, used by the user search"
+        },
+        "AccountSummary": {
+            "bsonType": "object",
+            "description": "'AccountSummary' must be an object, maintained by the accounts service",
+            "properties": {
+                "ActiveAccounts": {
+                    "bsonType": "int",
+                    "description": "'ActiveAccounts' must be an integer"
+                },
+                "ClosedAccounts": {
+                    "bsonType": "int",
+                    "description": "'ClosedAccounts' must be an integer"
+                },
+                "TotalBalance": {
+                    "bsonType": ["double", "int", "long"],
+                    "description": "'TotalBalance' must be a number"
+                },
+                "ByType": {
+                    "bsonType": "object",
+                    "description": "'ByType' must be an object of Active/Closed counts per account type"
+                }
+            }
+        }
+    }
+}
@@ -1,6 +1,10 @@
 import json
 from datetime import datetime
+import bson
 from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from models.account import Account
+from models.user import User
 
 # Inspired by https://sentry.io/answers/fastapi-and-mongodb-objectid-object-is-not-iterable-error/#solution-2-define-a-custom-jsonencoder-class
 
@@ -15,4 +19,8 @@ class MyJSONEncoder(json.JSONEncoder):
             return str(o)  # Convert ObjectId to string
         if isinstance(o, datetime):
             return o.isoformat()  # Convert datetime to ISO 8601 string
+        if isinstance(o, (Account, User)):
+            return o.to_dict()  # Convert domain models to their document form
+        if isinstance(o, RawBSONDocument):
+            return bson.decode(o.raw)  # Decode passthrough documents for JSON output
         return super().default(o)
\ No newline at end of file
@@ -0,0 +1,225 @@
+import gzip
+import json
+from datetime import datetime, timezone
+from typing import Optional
+
+import bson
+from bson import ObjectId
+from bson.codec_options import CodecOptions, TypeRegistry
+from bson.raw_bson import RawBSONDocument
+from fastapi import Request, Response
+
+from encoder.json_encoder import MyJSONEncoder
+from models.account import Account
+from models.user import User
+
+# Optional codecs: MessagePack and zstd are only offered when installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON_MEDIA_TYPE = "application/json"
+BSON_MEDIA_TYPE = "application/bson"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# MessagePack extension type code used for 12-byte ObjectIds
+MSGPACK_OBJECTID_EXT_CODE = 1
+
+_MEDIA_TYPE_ALIASES = {
+    "application/json": JSON_MEDIA_TYPE,
+    "application/bson": BSON_MEDIA_TYPE,
+    "application/msgpack": MSGPACK_MEDIA_TYPE,
+    "application/x-msgpack": MSGPACK_MEDIA_TYPE,
+}
+
+
+def _parse_header_values(header: Optional[str]) -> list[tuple[str, float]]:
+    """Parse an Accept-style header into (value, q) pairs sorted by preference.
+
+    Args:
+        header (Optional[str]): The raw header value.
+
+    Returns:
+        list[tuple[str, float]]: The values with their quality factor, best first.
+    """
+    values = []
+    if not header:
+        return values
+    for position, part in enumerate(header.split(",")):
+        pieces = part.strip().split(";")
+        value = pieces[0].strip().lower()
+        if not value:
+            continue
+        q = 1.0
+        for param in pieces[1:]:
+            name, _, raw_q = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(raw_q)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            values.append((value, q, position))
+    values.sort(key=lambda item: (-item[1], item[2]))
+    return [(value, q) for value, q, _ in values]
+
+
+def _bson_fallback_encoder(o):
+    """Fallback hook for bson, mapping domain models to their document form."""
+    if isinstance(o, (Account, User)):
+        return o.to_dict()
+    return o
+
+
+_BSON_CODEC_OPTIONS = CodecOptions(
+    type_registry=TypeRegistry(fallback_encoder=_bson_fallback_encoder))
+
+
+def _msgpack_default(o):
+    """Fallback hook for msgpack, mapping BSON types to native MessagePack types."""
+    if isinstance(o, (Account, User)):
+        return o.to_dict()
+    if isinstance(o, ObjectId):
+        return msgpack.ExtType(MSGPACK_OBJECTID_EXT_CODE, o.binary)
+    if isinstance(o, datetime):
+        if o.tzinfo is None:
+            o = o.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(o)
+    if isinstance(o, RawBSONDocument):
+        return bson.decode(o.raw)
+    raise TypeError(f"Object of type {type(o).__name__} is not MessagePack serializable")
+
+
+class ResponseEncoder:
+    """This class builds API responses in the format and encoding negotiated with the client.
+
+    JSON remains the default. Clients may ask for BSON (ObjectIds and dates stay native)
+    or MessagePack (ObjectIds as extension type 1, dates as timestamps) through the
+    Accept header, and for gzip or zstd compression through Accept-Encoding.
+
+    RawBSONDocument values are written to BSON bodies as-is, without being decoded.
+    """
+
+    def __init__(self, compression_min_bytes: int = 1024, compression_level: int = 6,
+                 raw_bson_passthrough: bool = False):
+        """Initialize the ResponseEncoder.
+
+        Args:
+            compression_min_bytes (int): Bodies smaller than this are never compressed.
+            compression_level (int): The gzip/zstd compression level.
+            raw_bson_passthrough (bool): Whether BSON responses may be served from RawBSONDocument reads.
+
+        Returns:
+            None
+        """
+        self.compression_min_bytes = compression_min_bytes
+        self.compression_level = compression_level
+        self.raw_bson_passthrough = raw_bson_passthrough
+        self.media_types = [JSON_MEDIA_TYPE, BSON_MEDIA_TYPE]
+        if msgpack is not None:
+            self.media_types.append(MSGPACK_MEDIA_TYPE)
+        self.content_encodings = ["gzip"]
+        if zstandard is not None:
+            self.content_encodings.insert(0, "zstd")
+
+    def negotiate_media_type(self, accept: Optional[str]) -> str:
+        """Pick the response media type from an Accept header.
+
+        Args:
+            accept (Optional[str]): The Accept header value.
+
+        Returns:
+            str: The negotiated media type, JSON when nothing better matches.
+        """
+        for value, _ in _parse_header_values(accept):
+            if value in ("*/*", "application/*"):
+                return JSON_MEDIA_TYPE
+            media_type = _MEDIA_TYPE_ALIASES.get(value)
+            if media_type in self.media_types:
+                return media_type
+        return JSON_MEDIA_TYPE
+
+    def wants_raw_bson(self, request: Request) -> bool:
+        """Check whether a request should be served from undecoded RawBSONDocument reads.
+
+        Args:
+            request (Request): The incoming request.
+
+        Returns:
+            bool: True if passthrough is enabled and the client negotiated BSON.
+        """
+        return (self.raw_bson_passthrough
+                and self.negotiate_media_type(request.headers.get("accept")) == BSON_MEDIA_TYPE)
+
+    def negotiate_content_encoding(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """Pick the response content encoding from an Accept-Encoding header.
+
+        Args:
+            accept_encoding (Optional[str]): The Accept-Encoding header value.
+
+        Returns:
+            Optional[str]: "zstd", "gzip" or None for an uncompressed response.
+        """
+        accepted = dict(_parse_header_values(accept_encoding))
+        for encoding in self.content_encodings:
+            if encoding in accepted or "*" in accepted:
+                return encoding
+        return None
+
+    def serialize(self, payload: dict, media_type: str) -> bytes:
+        """Serialize a payload to the given media type.
+
+        Args:
+            payload (dict): The response document.
+            media_type (str): One of the supported media types.
+
+        Returns:
+            bytes: The serialized body.
+        """
+        if media_type == BSON_MEDIA_TYPE:
+            return bson.encode(payload, codec_options=_BSON_CODEC_OPTIONS)
+        if media_type == MSGPACK_MEDIA_TYPE:
+            return msgpack.packb(payload, default=_msgpack_default, use_bin_type=True)
+        return json.dumps(payload, cls=MyJSONEncoder).encode("utf-8")
+
+    def compress(self, body: bytes, content_encoding: str) -> bytes:
+        """Compress a body with the given content encoding.
+
+        Args:
+            body (bytes): The serialized body.
+            content_encoding (str): "zstd" or "gzip".
+
+        Returns:
+            bytes: The compressed body.
+        """
+        if content_encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.compression_level).compress(body)
+        return gzip.compress(body, compresslevel=self.compression_level)
+
+    def encode(self, request: Request, payload: dict, compress: bool = False) -> Response:
+        """Build the response for a payload according to the request headers.
+
+        Args:
+            request (Request): The incoming request, used for content negotiation.
+            payload (dict): The response document.
+            compress (bool): Whether the body may be compressed. Defaults to False.
+
+        Returns:
+            Response: The encoded response.
+        """
+        media_type = self.negotiate_media_type(request.headers.get("accept"))
+        body = self.serialize(payload, media_type)
+        headers = {"Vary": "Accept, Accept-Encoding"}
+        if compress and len(body) >= self.compression_min_bytes:
+            content_encoding = self.negotiate_content_encoding(
+                request.headers.get("accept-encoding"))
+            if content_encoding:
+                body = self.compress(body, content_encoding)
+                headers["Content-Encoding"] = content_encoding
+        return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,30 @@
+"""Move accounts closed for longer than ARCHIVE_CLOSED_AFTER_DAYS to the accounts_archive collection.
+
+Run from the backend directory: python -m jobs.archive_closed_accounts
+Safe to re-run, e.g. after an interruption or on a schedule.
+"""
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from database.connection import MongoDBConnection
+from services.accounts_service import AccountsService
+from utils.logging_config import setup_logging
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI")
+ARCHIVE_CLOSED_AFTER_DAYS = int(os.getenv("ARCHIVE_CLOSED_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+setup_logging(level=logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper()))
+
+
+if __name__ == "__main__":
+    connection = MongoDBConnection(MONGODB_URI)
+    accounts_service = AccountsService(
+        connection, "leafy_bank", "accounts", "users",
+        accounts_archive_collection_name="accounts_archive")
+    accounts_service.ensure_indexes()
+    accounts_service.archive_closed_accounts(ARCHIVE_CLOSED_AFTER_DAYS, ARCHIVE_BATCH_SIZE)
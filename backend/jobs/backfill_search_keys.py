@@ -0,0 +1,26 @@
+"""Set the lowercase SearchKeys used by /search-users on every user.
+
+Run from the backend directory: python -m jobs.backfill_search_keys
+Run it again whenever users are added or renamed outside this service.
+"""
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from database.connection import MongoDBConnection
+from services.users_service import UsersService
+from utils.logging_config import setup_logging
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI")
+
+setup_logging(level=logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper()))
+
+
+if __name__ == "__main__":
+    connection = MongoDBConnection(MONGODB_URI)
+    users_service = UsersService(connection, "leafy_bank", "users")
+    users_service.ensure_indexes()
+    users_service.backfill_search_keys()
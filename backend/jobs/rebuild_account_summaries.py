@@ -0,0 +1,25 @@
+"""Recompute the AccountSummary of every user from the accounts collection.
+
+Run from the backend directory: python -m jobs.rebuild_account_summaries
+"""
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from database.connection import MongoDBConnection
+from services.accounts_service import AccountsService
+from utils.logging_config import setup_logging
+
+load_dotenv()
+
+MONGODB_URI = os.getenv("MONGODB_URI")
+
+setup_logging(level=logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper()))
+
+
+if __name__ == "__main__":
+    connection = MongoDBConnection(MONGODB_URI)
+    accounts_service = AccountsService(connection, "leafy_bank", "accounts", "users")
+    accounts_service.ensure_indexes()
+    accounts_service.rebuild_account_summaries()
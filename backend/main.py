@@ -1,17 +1,35 @@
 from database.connection import MongoDBConnection
+from database.latency_monitor import CommandLatencyMonitor
 from services.accounts_service import AccountsService
 from services.users_service import UsersService
+from services.account_events_service import AccountEventsService
+from services.idempotency_service import IdempotencyService
 from encoder.json_encoder import MyJSONEncoder
-
+from database.read_preferences import read_preference_from_config
+from encoder.response_encoder import ResponseEncoder
+from middleware.admission_control import AdmissionControlMiddleware, admission_group
+from middleware.deadlines import DeadlineMiddleware, is_deadline_exceeded
+from middleware.idempotency import IdempotencyMiddleware
+from middleware.profiling import PROFILE_TOKEN_HEADER, ProfiledRoute, ProfileStore, ProfilingMiddleware
+from middleware.request_route import RequestRouteMiddleware
+from utils.config import parse_route_map
+from utils.logging_config import setup_logging
+
+import asyncio
+import json
 import logging
 
-from typing import List, Dict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Dict, Optional
 
-import json
+import anyio.to_thread
 from bson import ObjectId
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import APIRouter
@@ -20,13 +38,180 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-# Logging
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+# Logging: JSON records written by a background thread, routine INFO records sampled per route
+setup_logging(
+    level=logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper()),
+    default_sample_rate=float(os.getenv("LOG_SAMPLE_RATE", "1.0")),
+    route_sample_rates=parse_route_map(os.getenv("LOG_SAMPLE_RATES", ""), float))
+logger = logging.getLogger(__name__)
 
 MONGODB_URI = os.getenv("MONGODB_URI")
+RESPONSE_COMPRESSION_MIN_BYTES = int(
+    os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+RAW_BSON_PASSTHROUGH = os.getenv(
+    "RAW_BSON_PASSTHROUGH", "false").lower() == "true"
+BULK_READ_PREFERENCE = os.getenv("BULK_READ_PREFERENCE", "primary")
+BULK_READ_MAX_STALENESS_SECONDS = int(
+    os.getenv("BULK_READ_MAX_STALENESS_SECONDS", "-1"))
+ADMISSION_DEFAULT_LIMIT = int(os.getenv("ADMISSION_DEFAULT_LIMIT", "64"))
+ADMISSION_ROUTE_LIMITS = parse_route_map(os.getenv(
+    "ADMISSION_ROUTE_LIMITS", "/fetch-accounts=4,/fetch-active-accounts=4,/fetch-users=4"), int)
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_MAX_WAIT_SECONDS = float(
+    os.getenv("ADMISSION_MAX_WAIT_SECONDS", "1.0"))
+ADMISSION_RETRY_AFTER_SECONDS = int(
+    os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+ADMISSION_TARGET_MONGO_LATENCY_MS = float(
+    os.getenv("ADMISSION_TARGET_MONGO_LATENCY_MS", "50"))
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "5"))
+REQUEST_DEADLINE_ROUTES = parse_route_map(os.getenv(
+    "REQUEST_DEADLINE_ROUTES", "/fetch-accounts=15,/fetch-active-accounts=15,/fetch-users=15"), float)
+ACCOUNT_CHANGES_SETTLE_SECONDS = float(
+    os.getenv("ACCOUNT_CHANGES_SETTLE_SECONDS", "5"))
+ACCOUNT_EVENTS_KEEPALIVE_SECONDS = float(
+    os.getenv("ACCOUNT_EVENTS_KEEPALIVE_SECONDS", "15"))
+IDEMPOTENCY_KEY_TTL_SECONDS = int(
+    os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_MAX_WAIT_SECONDS = float(
+    os.getenv("IDEMPOTENCY_MAX_WAIT_SECONDS", "10"))
+IDEMPOTENCY_LEASE_SECONDS = float(
+    os.getenv("IDEMPOTENCY_LEASE_SECONDS", "30"))
+ACCOUNT_NUMBER_BLOCK_SIZE = int(os.getenv("ACCOUNT_NUMBER_BLOCK_SIZE", "100"))
+USER_ID_CACHE_TTL_SECONDS = float(
+    os.getenv("USER_ID_CACHE_TTL_SECONDS", "300"))
+USER_LEAN_ARRAY_LIMIT = int(os.getenv("USER_LEAN_ARRAY_LIMIT", "10"))
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_MAX_PROFILES = int(os.getenv("PROFILING_MAX_PROFILES", "20"))
+PROFILING_MIN_INTERVAL_SECONDS = float(
+    os.getenv("PROFILING_MIN_INTERVAL_SECONDS", "10"))
+
+
+# Initialize the MongoDB connection
+db_name = "leafy_bank"
+accounts_collection_name = "accounts"
+users_collection_name = "users"
+accounts_archive_collection_name = "accounts_archive"
+counters_collection_name = "counters"
+idempotency_collection_name = "idempotency_keys"
+
+# Average MongoDB command latency per admission route group, drives the adaptive admission limits
+mongo_latency_monitor = CommandLatencyMonitor(key_source=admission_group.get)
+
+connection = MongoDBConnection(
+    MONGODB_URI, event_listeners=[mongo_latency_monitor])
+
+# Read preference for full-collection lists and reports; lookups and writes stay on the primary
+bulk_read_preference = read_preference_from_config(
+    BULK_READ_PREFERENCE, BULK_READ_MAX_STALENESS_SECONDS)
 
-app = FastAPI()
+# Initialize the AccountService
+accounts_service = AccountsService(
+    connection, db_name, accounts_collection_name, users_collection_name,
+    bulk_read_preference=bulk_read_preference,
+    accounts_archive_collection_name=accounts_archive_collection_name,
+    counters_collection_name=counters_collection_name,
+    account_number_block_size=ACCOUNT_NUMBER_BLOCK_SIZE,
+    user_id_cache_ttl_seconds=USER_ID_CACHE_TTL_SECONDS)
+
+# Initialize the UsersService
+users_service = UsersService(
+    connection, db_name, users_collection_name,
+    bulk_read_preference=bulk_read_preference,
+    lean_array_limit=USER_LEAN_ARRAY_LIMIT)
+
+# Initialize the AccountEventsService (one shared change stream per worker)
+# The change stream runs on its own client, without the latency monitor: idle getMores
+# wait up to max_await_time_ms on the server and would inflate the admission latency
+events_connection = MongoDBConnection(MONGODB_URI)
+account_events_service = AccountEventsService(
+    events_connection, db_name, accounts_collection_name)
+
+# Initialize the IdempotencyService (responses of retried writes)
+idempotency_service = IdempotencyService(
+    connection, db_name, idempotency_collection_name,
+    ttl_seconds=IDEMPOTENCY_KEY_TTL_SECONDS, cache_size=IDEMPOTENCY_CACHE_SIZE,
+    lease_seconds=IDEMPOTENCY_LEASE_SECONDS)
+
+# Initialize the ProfileStore, only when profiling is enabled and a token is set
+profile_store = None
+if PROFILING_ENABLED and PROFILING_TOKEN:
+    profile_store = ProfileStore(
+        PROFILING_TOKEN, max_profiles=PROFILING_MAX_PROFILES,
+        min_interval_seconds=PROFILING_MIN_INTERVAL_SECONDS)
+
+# Initialize the ResponseEncoder (JSON/BSON/MessagePack, gzip/zstd)
+response_encoder = ResponseEncoder(
+    RESPONSE_COMPRESSION_MIN_BYTES, raw_bson_passthrough=RAW_BSON_PASSTHROUGH)
+
+
+# Threads needed to run every admitted request at once, plus a few for the routes exempt
+# from admission control, which also resolve users in the threadpool
+ADMISSION_THREAD_CAPACITY = ADMISSION_DEFAULT_LIMIT + sum(ADMISSION_ROUTE_LIMITS.values()) + 8
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the indexes the services rely on before serving requests."""
+    # Sync handlers run on anyio's default thread limiter, 40 threads unless raised. Size
+    # it to the admission limits, so that admitted requests never wait for a thread in an
+    # unbounded queue that admission control neither sees nor sheds
+    thread_limiter = anyio.to_thread.current_default_thread_limiter()
+    if thread_limiter.total_tokens < ADMISSION_THREAD_CAPACITY:
+        logger.info("Raising the threadpool from %s to %s threads to match the admission limits",
+                    thread_limiter.total_tokens, ADMISSION_THREAD_CAPACITY)
+        thread_limiter.total_tokens = ADMISSION_THREAD_CAPACITY
+    accounts_service.ensure_indexes()
+    users_service.ensure_indexes()
+    idempotency_service.ensure_indexes()
+    yield
+    account_events_service.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+# Profiling: requests sent with the X-Profile-Token header run under cProfile.
+# Added first (innermost), so that the profile covers the route handler only
+if profile_store is not None:
+    # Reading the profiles takes the token too; those requests must not use up the
+    # rate cap or push real profiles out of the store
+    app.add_middleware(ProfilingMiddleware, profile_store=profile_store,
+                       exempt_path_prefixes=("/admin/profiles",))
+    # Sync handlers run in the threadpool, where they are profiled by their route
+    app.router.route_class = ProfiledRoute
+
+# Idempotency keys: retried writes get the stored response instead of running again.
+# Added right after profiling, inside the deadline and CORS middlewares, so that key
+# lookups run under the request deadline and replayed responses still carry the CORS
+# headers; replays answer before the profiler starts
+app.add_middleware(
+    IdempotencyMiddleware,
+    idempotency_service=idempotency_service,
+    routes={"/create-account", "/close-account"},
+    max_wait_seconds=IDEMPOTENCY_MAX_WAIT_SECONDS,
+)
+
+# Admission control: per-route concurrency limits with a bounded wait queue, 503 when exceeded.
+# Added before CORS so that shed responses still carry the CORS headers.
+app.add_middleware(
+    AdmissionControlMiddleware,
+    default_limit=ADMISSION_DEFAULT_LIMIT,
+    route_limits=ADMISSION_ROUTE_LIMITS,
+    queue_size=ADMISSION_QUEUE_SIZE,
+    max_wait_seconds=ADMISSION_MAX_WAIT_SECONDS,
+    retry_after_seconds=ADMISSION_RETRY_AFTER_SECONDS,
+    latency_source=mongo_latency_monitor.latency_for,
+    target_latency_ms=ADMISSION_TARGET_MONGO_LATENCY_MS,
+    exempt_routes={"/account-events"},
+)
+
+# Deadlines: every MongoDB operation of a request runs under pymongo.timeout(),
+# so queueing for admission and all queries share one time budget
+app.add_middleware(
+    DeadlineMiddleware,
+    default_seconds=REQUEST_DEADLINE_SECONDS,
+    route_seconds=REQUEST_DEADLINE_ROUTES,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -36,20 +221,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Logging: binds the request path for per-route sampling. Added last (outermost),
+# so that every record of the request, the access log line included, carries it
+app.add_middleware(RequestRouteMiddleware)
+
 router = APIRouter()
 
-# Initialize the MongoDB connection
-db_name = "leafy_bank"
-accounts_collection_name = "accounts"
-users_collection_name = "users"
-connection = MongoDBConnection(MONGODB_URI)
 
-# Initialize the AccountService
-accounts_service = AccountsService(
-    connection, db_name, accounts_collection_name, users_collection_name)
+def raise_if_deadline_exceeded(error: Exception):
+    """Map an expired request deadline to a 504 Gateway Timeout.
 
-# Initialize the UsersService
-users_service = UsersService(connection, db_name, users_collection_name)
+    Args:
+        error (Exception): The error caught by a route handler.
+
+    Raises:
+        HTTPException: 504 if the error is a pymongo timeout.
+    """
+    if is_deadline_exceeded(error):
+        raise HTTPException(
+            status_code=504, detail="Request deadline exceeded") from error
 
 
 @app.get("/")
@@ -57,13 +247,18 @@ async def read_root(request: Request):
     return {"message": "Server is running"}
 
 
+class FetchAccountsRequest(BaseModel):
+    include_archived: bool = False
+
+
 class FetchAccountsResponse(BaseModel):
     accounts: List[Dict]
 
 
 @app.post("/fetch-accounts", response_model=FetchAccountsResponse)
-async def fetch_accounts():
+def fetch_accounts(request: Request, accounts_data: Optional[FetchAccountsRequest] = None):
     """Retrieve all accounts, optionally excluding a specific account.
+    Accounts closed long ago are archived and only returned with {"include_archived": true}.
     Args:
         request (Request): The request object containing an optional account_id to exclude.
     Returns:
@@ -71,17 +266,20 @@ async def fetch_accounts():
     """
     try:
         # Directly fetch all accounts without exclusion logic
-        accounts = accounts_service.get_accounts()
-        logging.info(f"Retrieved {len(accounts)} accounts from the database")
+        include_archived = accounts_data.include_archived if accounts_data else False
+        accounts = accounts_service.get_accounts(
+            raw=response_encoder.wants_raw_bson(request), include_archived=include_archived)
+        logger.info("Retrieved %s accounts from the database", len(accounts))
 
-        return Response(content=json.dumps({"accounts": accounts}, cls=MyJSONEncoder), media_type="application/json")
+        return response_encoder.encode(request, {"accounts": accounts}, compress=True)
     except Exception as e:
-        logging.error(f"Error retrieving accounts: {str(e)}")
+        logger.error("Error retrieving accounts: %s", e)
+        raise_if_deadline_exceeded(e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/fetch-active-accounts", response_model=FetchAccountsResponse)
-async def fetch_active_accounts():
+def fetch_active_accounts(request: Request):
     """Retrieve all active accounts, optionally excluding a specific account.
     Args:
         request (Request): The request object containing an optional account_id to exclude.
@@ -91,12 +289,12 @@ async def fetch_active_accounts():
     try:
         # Directly fetch all active accounts without exclusion logic
         accounts = accounts_service.get_active_accounts()
-        logging.info(
-            f"Retrieved {len(accounts)} active accounts from the database")
+        logger.info("Retrieved %s active accounts from the database", len(accounts))
 
-        return Response(content=json.dumps({"accounts": accounts}, cls=MyJSONEncoder), media_type="application/json")
+        return response_encoder.encode(request, {"accounts": accounts}, compress=True)
     except Exception as e:
-        logging.error(f"Error retrieving active accounts: {str(e)}")
+        logger.error("Error retrieving active accounts: %s", e)
+        raise_if_deadline_exceeded(e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -109,7 +307,7 @@ class FindAccountByNumberResponse(BaseModel):
 
 
 @app.post("/find-account-by-number", response_model=FindAccountByNumberResponse)
-async def find_account_by_number(request: Request, account_data: FindAccountByNumberRequest):
+def find_account_by_number(request: Request, account_data: FindAccountByNumberRequest):
     """Retrieve an account by its number.
     Args:
         request (Request): The request object containing the account number.
@@ -117,31 +315,27 @@ async def find_account_by_number(request: Request, account_data: FindAccountByNu
         dict: The account document if found, otherwise an error message.
     """
     try:
-        data = await request.json()
-        account_number = data.get("account_number")
-
-        if account_number is None:
-            raise HTTPException(
-                status_code=400, detail="Account number is required")
-
-        # Ensure account_number is treated as a string
-        account_number = str(account_number)
+        # The body is parsed once, into account_data
+        account_number = account_data.account_number
 
         account = accounts_service.get_account_by_number(account_number)
         if account:
-            logging.info(f"Found account with number {account_number}")
-            return Response(content=json.dumps({"account": account}, cls=MyJSONEncoder), media_type="application/json")
+            logger.info("Found account with number %s", account_number)
+            return response_encoder.encode(request, {"account": account})
         else:
-            logging.info(f"No account found with number {account_number}")
+            logger.info("No account found with number %s", account_number)
             raise HTTPException(status_code=404, detail="Account not found")
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error retrieving account by number: {str(e)}")
+        logger.error("Error retrieving account by number: %s", e)
+        raise_if_deadline_exceeded(e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
 @app.post("/find-active-account-by-number", response_model=FindAccountByNumberResponse)
-async def find_active_account_by_number(request: Request, account_data: FindAccountByNumberRequest):
+def find_active_account_by_number(request: Request, account_data: FindAccountByNumberRequest):
     """Retrieve an active account by its number.
     Args:
         request (Request): The request object containing the account number.
@@ -149,35 +343,29 @@ async def find_active_account_by_number(request: Request, account_data: FindAcco
         dict: The account document if found, otherwise an error message.
     """
     try:
-        data = await request.json()
-        account_number = data.get("account_number")
-
-        if account_number is None:
-            raise HTTPException(
-                status_code=400, detail="Account number is required")
-
-        # Ensure account_number is treated as a string
-        account_number = str(account_number)
+        # The body is parsed once, into account_data
+        account_number = account_data.account_number
 
         account = accounts_service.get_active_account_by_number(account_number)
         if account:
-            logging.info(f"Found active account with number {account_number}")
-            return Response(content=json.dumps({"account": account}, cls=MyJSONEncoder), media_type="application/json")
+            logger.info("Found active account with number %s", account_number)
+            return response_encoder.encode(request, {"account": account})
         else:
-            logging.info(
-                f"No active account found with number {account_number}")
+            logger.info("No active account found with number %s", account_number)
             raise HTTPException(
                 status_code=404, detail="Active account not found")
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error retrieving active account by number: {str(e)}")
+        logger.error("Error retrieving active account by number: %s", e)
+        raise_if_deadline_exceeded(e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
 class CreateAccountRequest(BaseModel):
     UserName: str
     UserId: str
-    AccountNumber: str
     AccountBalance: float
     AccountType: str
 
@@ -185,11 +373,13 @@ class CreateAccountRequest(BaseModel):
 class CreateAccountResponse(BaseModel):
     message: str
     account_id: str
+    account_number: str
 
 
 @app.post("/create-account", response_model=CreateAccountResponse)
-async def create_account(request: Request, account_data: CreateAccountRequest):
+def create_account(request: Request, account_data: CreateAccountRequest):
     """Create a new account with the provided data.
+    The account number is allocated by the service and returned in the response.
 
     Args:
         request (Request): The request object containing account data.
@@ -199,62 +389,38 @@ async def create_account(request: Request, account_data: CreateAccountRequest):
         AccountResponse: A dictionary indicating success with the created account ID.
     """
     try:
-        data = await request.json()
-
-        # Extract required fields from the request data
-        user_name = data.get("UserName")
-        user_id = data.get("UserId")
-        account_number = data.get("AccountNumber")
-        account_balance = data.get("AccountBalance")
-        account_type = data.get("AccountType")
-
-        # Validate required fields
-        if not all([user_name, user_id, account_number, account_balance, account_type]):
+        # The body is parsed once, into account_data
+        user_name = account_data.UserName
+        user_id = account_data.UserId
+        account_balance = account_data.AccountBalance
+        account_type = account_data.AccountType
+
+        # Validate required fields (AccountBalance is already a float and may be 0)
+        if not all([user_name, user_id, account_type]):
             raise HTTPException(
                 status_code=400, detail="Missing required account data")
 
-        # Validate account balance is a float
-        try:
-            account_balance = float(account_balance)
-        except ValueError:
-            raise HTTPException(
-                status_code=400, detail="Account balance must be a valid number.")
-
-        # Validate account balance constraints
-        if account_balance < 0:
-            raise HTTPException(
-                status_code=400, detail="Account balance must be greater than or equal to 0.")
-
-        initial_balance_limit = float(1000000)
-        if account_balance > initial_balance_limit:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Account balance exceeds the limit of {initial_balance_limit}.")
-
-        # Check for duplicate account number before creation
-        if accounts_service.accounts_collection.find_one({"AccountNumber": account_number}):
-            raise HTTPException(
-                status_code=400, detail="An account with this number already exists.")
-
-        # Create the account using the refactored function
-        account_id = accounts_service.create_account(
+        # Create the account; the service validates the balance and the account
+        # against the collection schema, and raises ValueError (400) if invalid
+        account_id, account_number = accounts_service.create_account(
             user_name=user_name,
             user_id=user_id,
-            account_number=account_number,
             account_balance=account_balance,
             account_type=account_type
         )
 
-        logging.info(f"Account created with ID {account_id}")
-        return {"message": "Account created successfully", "account_id": str(account_id)}
+        logger.info("Account created with ID %s and number %s", account_id, account_number)
+        return {"message": "Account created successfully", "account_id": str(account_id),
+                "account_number": account_number}
 
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except HTTPException as he:
-        logging.error(f"HTTP error creating account: {str(he)}")
+        logger.error("HTTP error creating account: %s", he)
         raise he
     except Exception as e:
-        logging.error(f"Error creating account: {str(e)}")
+        logger.error("Error creating account: %s", e)
+        raise_if_deadline_exceeded(e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
@@ -264,10 +430,11 @@ class CloseAccountRequest(BaseModel):
 
 class CloseAccountResponse(BaseModel):
     message: str
+    account_id: str
 
 
-@app.post("/close-account", response_model=CreateAccountResponse)
-async def close_account(request: Request, account_data: CloseAccountRequest):
+@app.post("/close-account", response_model=CloseAccountResponse)
+def close_account(request: Request, account_data: CloseAccountRequest):
     """
     Close an account by its ID: account_id if the balance is zero.
 
@@ -279,21 +446,24 @@ async def close_account(request: Request, account_data: CloseAccountRequest):
         CreateAccountResponse: A dictionary indicating success with the created account ID.
     """
     try:
-        data = await request.json()
-        account_id = data.get("account_id")
+        # The body is parsed once, into account_data
+        account_id = account_data.account_id
         if not account_id or not ObjectId.is_valid(account_id):
             raise HTTPException(
                 status_code=400, detail="Invalid account ID format")
         success = accounts_service.close_account(account_id)
         if success:
-            logging.info(f"Account with ID {account_id} closed successfully")
+            logger.info("Account with ID %s closed successfully", account_id)
             return {"account_id": account_id, "message": "Account closed successfully"}
         else:
-            logging.error(f"Account with ID {account_id} cannot be closed")
+            logger.error("Account with ID %s cannot be closed", account_id)
             raise HTTPException(
                 status_code=400, detail="Account cannot be closed")
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error closing account: {str(e)}")
+        logger.error("Error closing account: %s", e)
+        raise_if_deadline_exceeded(e)
         raise HTTPException(status_code=500, detail=str(e))
 
 class FetchAccountsForUserRequest(BaseModel):
@@ -301,7 +471,7 @@ class FetchAccountsForUserRequest(BaseModel):
 
 
 @app.post("/fetch-accounts-for-user", response_model=FetchAccountsResponse)
-async def fetch_accounts_for_user(request: Request, user_data: FetchAccountsForUserRequest):
+def fetch_accounts_for_user(request: Request, user_data: FetchAccountsForUserRequest):
     """Retrieve all accounts for a specific user by UserName or ID.
     Args:
         request (Request): The request object containing the user_identifier.
@@ -309,8 +479,8 @@ async def fetch_accounts_for_user(request: Request, user_data: FetchAccountsForU
         dict: A list of accounts associated with the user.
     """
     try:
-        data = await request.json()
-        user_identifier = data.get("user_identifier")
+        # The body is parsed once, into user_data
+        user_identifier = user_data.user_identifier
         if not user_identifier:
             raise HTTPException(
                 status_code=400, detail="User identifier is required")
@@ -318,19 +488,21 @@ async def fetch_accounts_for_user(request: Request, user_data: FetchAccountsForU
             user_identifier = ObjectId(user_identifier)
         accounts = accounts_service.get_accounts_for_user(user_identifier)
         if accounts:
-            logging.info(
-                f"Found {len(accounts)} accounts for user {user_identifier}")
-            return Response(content=json.dumps({"accounts": accounts}, cls=MyJSONEncoder), media_type="application/json")
+            logger.info("Found %s accounts for user %s", len(accounts), user_identifier)
+            return response_encoder.encode(request, {"accounts": accounts}, compress=True)
         else:
-            logging.info(f"No accounts found for user {user_identifier}")
-            return Response(content=json.dumps({"accounts": []}, cls=MyJSONEncoder), media_type="application/json")
+            logger.info("No accounts found for user %s", user_identifier)
+            return response_encoder.encode(request, {"accounts": []}, compress=True)
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error retrieving accounts for user: {str(e)}")
+        logger.error("Error retrieving accounts for user: %s", e)
+        raise_if_deadline_exceeded(e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/fetch-active-accounts-for-user", response_model=FetchAccountsResponse)
-async def fetch_active_accounts_for_user(request: Request, user_data: FetchAccountsForUserRequest):
+def fetch_active_accounts_for_user(request: Request, user_data: FetchAccountsForUserRequest):
     """Retrieve active accounts for a specific user by UserName or ID.
     Args:
         request (Request): The request object containing the user_identifier.
@@ -338,8 +510,8 @@ async def fetch_active_accounts_for_user(request: Request, user_data: FetchAccou
         dict: A list of active accounts associated with the user.
     """
     try:
-        data = await request.json()
-        user_identifier = data.get("user_identifier")
+        # The body is parsed once, into user_data
+        user_identifier = user_data.user_identifier
         if not user_identifier:
             raise HTTPException(
                 status_code=400, detail="User identifier is required")
@@ -348,39 +520,51 @@ async def fetch_active_accounts_for_user(request: Request, user_data: FetchAccou
         accounts = accounts_service.get_active_accounts_for_user(
             user_identifier)
         if accounts:
-            logging.info(
-                f"Found {len(accounts)} active accounts for user {user_identifier}")
-            return Response(content=json.dumps({"accounts": accounts}, cls=MyJSONEncoder), media_type="application/json")
+            logger.info("Found %s active accounts for user %s", len(accounts), user_identifier)
+            return response_encoder.encode(request, {"accounts": accounts}, compress=True)
         else:
-            logging.info(
-                f"No active accounts found for user {user_identifier}")
-            return Response(content=json.dumps({"accounts": []}, cls=MyJSONEncoder), media_type="application/json")
+            logger.info("No active accounts found for user %s", user_identifier)
+            return response_encoder.encode(request, {"accounts": []}, compress=True)
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error retrieving active accounts for user: {str(e)}")
+        logger.error("Error retrieving active accounts for user: %s", e)
+        raise_if_deadline_exceeded(e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class FetchUsersRequest(BaseModel):
+    lean: bool = True
+
+
 class FetchUsersResponse(BaseModel):
     users: List[Dict]
 
 
 @app.post("/fetch-users", response_model=FetchUsersResponse)
-async def fetch_users():
+def fetch_users(request: Request, users_data: Optional[FetchUsersRequest] = None):
     """Retrieve all users from the database.
+    Users are lean by default: only the latest RecentTransactions and the first
+    LinkedAccounts are returned. Send {"lean": false} for the full arrays.
+    Args:
+        request (Request): The request object containing the optional lean flag.
     Returns:
         dict: A list of all users.
     """
     try:
-        users = users_service.get_users()
-        logging.info(f"Retrieved {len(users)} users from the database")
-        return Response(content=json.dumps({"users": users}, cls=MyJSONEncoder), media_type="application/json")
+        lean = users_data.lean if users_data else True
+        users = users_service.get_users(lean=lean)
+        logger.info("Retrieved %s users from the database", len(users))
+        return response_encoder.encode(request, {"users": users}, compress=True)
     except Exception as e:
-        logging.error(f"Error retrieving users: {str(e)}")
+        logger.error("Error retrieving users: %s", e)
+        raise_if_deadline_exceeded(e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 class FindUserRequest(BaseModel):
     user_identifier: str
+    lean: bool = True
 
 
 class FindUserResponse(BaseModel):
@@ -388,28 +572,369 @@ class FindUserResponse(BaseModel):
 
 
 @app.post("/find-user", response_model=FindUserResponse)
-async def find_user(request: Request, user_data: FindUserRequest):
+def find_user(request: Request, user_data: FindUserRequest):
     """Retrieve a specific user by UserName or ID.
+    The user is lean unless "lean" is false, see /fetch-users; the full arrays are
+    paginated by /fetch-user-transactions and /fetch-user-linked-accounts.
     Args:
         request (Request): The request object containing the user_identifier.
     Returns:
         dict: The user document if found, otherwise an error message.
     """
     try:
-        data = await request.json()
-        user_identifier = data.get("user_identifier")
+        # The body is parsed once, into user_data
+        user_identifier = user_data.user_identifier
         if not user_identifier:
             raise HTTPException(
                 status_code=400, detail="User identifier is required")
         if ObjectId.is_valid(user_identifier):
             user_identifier = ObjectId(user_identifier)
-        user = users_service.get_user(user_identifier)
+        user = users_service.get_user(
+            user_identifier, raw=response_encoder.wants_raw_bson(request),
+            lean=user_data.lean)
         if user:
-            logging.info(f"User found with ID {user['_id']}")
-            return Response(content=json.dumps({"user": user}, cls=MyJSONEncoder), media_type="application/json")
+            logger.info("User found with identifier %s", user_identifier)
+            return response_encoder.encode(request, {"user": user})
         else:
-            logging.info(f"No user found with identifier {user_identifier}")
+            logger.info("No user found with identifier %s", user_identifier)
+            raise HTTPException(status_code=404, detail="User not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error retrieving user: %s", e)
+        raise_if_deadline_exceeded(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class SearchUsersRequest(BaseModel):
+    query: str = Field(min_length=1, max_length=100)
+    limit: int = Field(default=20, ge=1, le=100)
+    after: Optional[str] = None
+
+
+class SearchUsersResponse(BaseModel):
+    users: List[Dict]
+    next: Optional[str]
+
+
+@app.post("/search-users", response_model=SearchUsersResponse)
+def search_users(request: Request, search_data: SearchUsersRequest):
+    """Find users by the start of their UserName, UserEmail, first or last name, ignoring case.
+    Pass the returned "next" token as "after" to get the following page; it is null on the last page.
+    Users are written outside this service: those added or renamed since the last run of
+    jobs.backfill_search_keys are not found, or found under their former names.
+    Args:
+        request (Request): The request object containing the query, limit and optional after.
+    Returns:
+        dict: The matching users (_id, UserName, UserEmail and Name) and the next page token.
+    """
+    try:
+        users, next_token = users_service.search_users(
+            search_data.query, search_data.limit, search_data.after)
+        logger.info("Found %s users for search %s", len(users), search_data.query)
+        return response_encoder.encode(request, {"users": users, "next": next_token})
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error("Error searching users: %s", e)
+        raise_if_deadline_exceeded(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class FetchAccountSummaryRequest(BaseModel):
+    user_identifier: str
+
+
+class FetchAccountSummaryResponse(BaseModel):
+    summary: Dict
+
+
+@app.post("/fetch-account-summary-for-user", response_model=FetchAccountSummaryResponse)
+def fetch_account_summary_for_user(request: Request, user_data: FetchAccountSummaryRequest):
+    """Retrieve the account counts and total balance of a user by UserName or ID.
+    The summary is maintained on account creation and closure, so no account is read.
+    Args:
+        request (Request): The request object containing the user_identifier.
+    Returns:
+        dict: The user's AccountSummary if the user exists, otherwise an error message.
+    """
+    try:
+        user_identifier = user_data.user_identifier
+        if not user_identifier:
+            raise HTTPException(
+                status_code=400, detail="User identifier is required")
+        if ObjectId.is_valid(user_identifier):
+            user_identifier = ObjectId(user_identifier)
+        summary = users_service.get_account_summary(user_identifier)
+        if summary is None:
+            logger.info("No user found with identifier %s", user_identifier)
             raise HTTPException(status_code=404, detail="User not found")
+        logger.info("Found account summary for user %s", user_identifier)
+        return response_encoder.encode(request, {"summary": summary.to_dict()})
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error retrieving user: {str(e)}")
+        logger.error("Error retrieving account summary: %s", e)
+        raise_if_deadline_exceeded(e)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+class QueryAccountsRequest(BaseModel):
+    account_status: Optional[str] = "Active"
+    account_type: Optional[str] = None
+    min_balance: Optional[float] = None
+    max_balance: Optional[float] = None
+    opened_after: Optional[datetime] = None
+    opened_before: Optional[datetime] = None
+    limit: int = Field(default=100, ge=1, le=1000)
+    token: Optional[str] = None
+
+
+class QueryAccountsResponse(BaseModel):
+    accounts: List[Dict]
+    token: Optional[str]
+    has_more: bool
+
+
+@app.post("/query-accounts", response_model=QueryAccountsResponse)
+def query_accounts(request: Request, query_data: QueryAccountsRequest):
+    """Retrieve the accounts matching status, type, balance and opening date filters.
+    E.g. {"max_balance": 0} selects the active zero-balance accounts eligible for closure.
+    Accounts are ordered by balance; while has_more is true, pass the returned token
+    to get the next page. Status defaults to "Active"; send null for any status.
+    Args:
+        request (Request): The request object containing the filters, limit and optional token.
+    Returns:
+        dict: The matching accounts, the token of the next page and whether more remain.
+    """
+    try:
+        accounts, token, has_more = accounts_service.query_accounts(
+            account_status=query_data.account_status,
+            account_type=query_data.account_type,
+            min_balance=query_data.min_balance,
+            max_balance=query_data.max_balance,
+            opened_after=query_data.opened_after,
+            opened_before=query_data.opened_before,
+            limit=query_data.limit,
+            token=query_data.token)
+        logger.info("Query returned %s accounts", len(accounts))
+        return response_encoder.encode(
+            request, {"accounts": accounts, "token": token, "has_more": has_more}, compress=True)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error("Error querying accounts: %s", e)
+        raise_if_deadline_exceeded(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class UserArrayPageRequest(BaseModel):
+    user_identifier: str
+    skip: int = Field(default=0, ge=0)
+    limit: int = Field(default=20, ge=1, le=100)
+
+
+class FetchUserTransactionsResponse(BaseModel):
+    transactions: List[Dict]
+    total: int
+
+
+@app.post("/fetch-user-transactions", response_model=FetchUserTransactionsResponse)
+def fetch_user_transactions(request: Request, page_data: UserArrayPageRequest):
+    """Retrieve a page of a user's RecentTransactions, newest first.
+    Args:
+        request (Request): The request object containing the user_identifier, skip and limit.
+    Returns:
+        dict: The page of transactions and the user's total number of transactions.
+    """
+    try:
+        user_identifier = page_data.user_identifier
+        if not user_identifier:
+            raise HTTPException(
+                status_code=400, detail="User identifier is required")
+        if ObjectId.is_valid(user_identifier):
+            user_identifier = ObjectId(user_identifier)
+        page = users_service.get_recent_transactions(
+            user_identifier, page_data.skip, page_data.limit)
+        if page is None:
+            logger.info("No user found with identifier %s", user_identifier)
+            raise HTTPException(status_code=404, detail="User not found")
+        transactions, total = page
+        logger.info("Returning %s of %s transactions for user %s",
+                    len(transactions), total, user_identifier)
+        return response_encoder.encode(request, {"transactions": transactions, "total": total})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error retrieving user transactions: %s", e)
+        raise_if_deadline_exceeded(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class FetchUserLinkedAccountsResponse(BaseModel):
+    linked_accounts: List[str]
+    total: int
+
+
+@app.post("/fetch-user-linked-accounts", response_model=FetchUserLinkedAccountsResponse)
+def fetch_user_linked_accounts(request: Request, page_data: UserArrayPageRequest):
+    """Retrieve a page of a user's LinkedAccounts IDs, in linking order.
+    Args:
+        request (Request): The request object containing the user_identifier, skip and limit.
+    Returns:
+        dict: The page of account IDs and the user's total number of linked accounts.
+    """
+    try:
+        user_identifier = page_data.user_identifier
+        if not user_identifier:
+            raise HTTPException(
+                status_code=400, detail="User identifier is required")
+        if ObjectId.is_valid(user_identifier):
+            user_identifier = ObjectId(user_identifier)
+        page = users_service.get_linked_accounts(
+            user_identifier, page_data.skip, page_data.limit)
+        if page is None:
+            logger.info("No user found with identifier %s", user_identifier)
+            raise HTTPException(status_code=404, detail="User not found")
+        linked_accounts, total = page
+        logger.info("Returning %s of %s linked accounts for user %s",
+                    len(linked_accounts), total, user_identifier)
+        return response_encoder.encode(
+            request, {"linked_accounts": linked_accounts, "total": total})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error retrieving user linked accounts: %s", e)
+        raise_if_deadline_exceeded(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class AccountChangesRequest(BaseModel):
+    token: Optional[str] = None
+    limit: int = Field(default=500, ge=1, le=5000)
+
+
+class AccountChangesResponse(BaseModel):
+    changes: List[Dict]
+    token: Optional[str]
+    has_more: bool
+
+
+@app.post("/accounts-changes", response_model=AccountChangesResponse)
+def accounts_changes(request: Request, changes_data: AccountChangesRequest):
+    """Retrieve the accounts created, closed or updated since a changes token.
+    Clients mirroring the accounts collection start without a token, then pass the
+    returned token on each call to receive only the deltas. When has_more is true,
+    the next page is already available and can be fetched immediately.
+    Args:
+        request (Request): The request object containing the optional token and limit.
+    Returns:
+        dict: The changes, each with its ChangeType (created, closed or updated) and Account, and the next token.
+    """
+    try:
+        changes, token, has_more = accounts_service.get_account_changes(
+            changes_data.token, changes_data.limit, ACCOUNT_CHANGES_SETTLE_SECONDS)
+        logger.info("Returning %s account changes", len(changes))
+        return response_encoder.encode(
+            request, {"changes": changes, "token": token, "has_more": has_more}, compress=True)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        logger.error("Error retrieving account changes: %s", e)
+        raise_if_deadline_exceeded(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/account-events")
+async def account_events(request: Request, user_identifier: str):
+    """Stream a user's account lifecycle events as Server-Sent Events.
+    Replaces polling /fetch-active-accounts-for-user: an event named "created" or
+    "closed" is pushed, with the account as JSON data, whenever one of the user's
+    accounts is opened or closed. A keep-alive comment is sent while idle.
+    Args:
+        request (Request): The request object.
+        user_identifier (str): The UserName or ID of the user, as a query parameter.
+    Returns:
+        StreamingResponse: The text/event-stream of the user's account events.
+    """
+    try:
+        if ObjectId.is_valid(user_identifier):
+            user_identifier = ObjectId(user_identifier)
+        user_id = await run_in_threadpool(accounts_service.resolve_user_id, user_identifier)
+        if user_id is None:
+            raise HTTPException(status_code=404, detail="User not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error subscribing to account events: %s", e)
+        raise_if_deadline_exceeded(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    queue = account_events_service.subscribe(user_id)
+    logger.info("Subscribed to account events for user %s", user_id)
+
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), ACCOUNT_EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                data = json.dumps(event["account"], cls=MyJSONEncoder)
+                yield f"event: {event['event']}\ndata: {data}\n\n"
+        finally:
+            account_events_service.unsubscribe(user_id, queue)
+            logger.info("Unsubscribed from account events for user %s", user_id)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
+def require_profile_token(request: Request) -> ProfileStore:
+    """Check that profiling is enabled and the request carries the profiling token.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        ProfileStore: The profile store.
+
+    Raises:
+        HTTPException: 404 if profiling is disabled, 403 if the token is missing or wrong.
+    """
+    if profile_store is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get(PROFILE_TOKEN_HEADER.decode())
+    if not profile_store.is_authorized(token.encode() if token is not None else None):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+    return profile_store
+
+
+@app.get("/admin/profiles")
+async def list_profiles(request: Request):
+    """List the stored request profiles, newest first.
+    Args:
+        request (Request): The request object, carrying the X-Profile-Token header.
+    Returns:
+        dict: The profiles' id, method, path, status code, duration and creation date.
+    """
+    store = require_profile_token(request)
+    return {"profiles": store.list()}
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def download_profile(request: Request, profile_id: str):
+    """Download a stored request profile in the pstats format.
+    Args:
+        request (Request): The request object, carrying the X-Profile-Token header.
+        profile_id (str): The profile ID, as returned in the X-Profile-Id response header.
+    Returns:
+        Response: The pstats file, to open with pstats.Stats or snakeviz.
+    """
+    store = require_profile_token(request)
+    data = store.get(profile_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(content=data, media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'})
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Name of the limiter that admitted the current request, e.g. to attribute MongoDB latency per route group
+admission_group: ContextVar[Optional[str]] = ContextVar("admission_group", default=None)
+
+
+class ConcurrencyLimiter:
+    """This class bounds the number of concurrent requests of a route group.
+
+    Requests above the limit wait in a bounded FIFO queue for at most max_wait_seconds.
+    The limit adapts to MongoDB latency: it shrinks multiplicatively while latency is
+    above the target and grows back by one while it is below (AIMD).
+    """
+
+    def __init__(self, name: str, max_limit: int, queue_size: int, max_wait_seconds: float,
+                 min_limit: int = 1):
+        """Initialize the limiter.
+
+        Args:
+            name (str): The route group name, used in logs.
+            max_limit (int): The configured, and highest, concurrency limit.
+            queue_size (int): The maximum number of waiting requests.
+            max_wait_seconds (float): How long a queued request may wait for a slot.
+            min_limit (int): The lowest limit the adaptive logic may set. Defaults to 1.
+
+        Returns:
+            None
+        """
+        self.name = name
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.limit = max_limit
+        self.queue_size = queue_size
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if needed.
+
+        Returns:
+            bool: True if the request was admitted, False if it must be shed.
+        """
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # The slot is handed over by release(), which resolves the future
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait_seconds)
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as the wait ended, give it back
+                self.release()
+            else:
+                waiter.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return False
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self):
+        """Free a slot, handing it to the oldest waiter if the limit allows."""
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def adjust(self, latency_ms: float, target_latency_ms: float):
+        """Adapt the limit to the observed MongoDB latency.
+
+        Args:
+            latency_ms (float): The current average command latency.
+            target_latency_ms (float): The latency above which the limit shrinks.
+
+        Returns:
+            None
+        """
+        previous = self.limit
+        if latency_ms > target_latency_ms:
+            self.limit = max(self.min_limit, int(self.limit * 0.9))
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+        if self.limit != previous:
+            logger.info("Admission limit for %s changed from %s to %s (Mongo latency %.1f ms)",
+                        self.name, previous, self.limit, latency_ms)
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware that sheds load before it reaches the MongoDB connection pool.
+
+    Each configured route gets its own ConcurrencyLimiter, so expensive list endpoints
+    cannot starve cheap lookups, which share the default limiter. Requests that cannot
+    be admitted get an immediate 503 with a Retry-After header.
+
+    Each limiter adapts to the MongoDB latency of its own route group, read from
+    latency_source with the limiter name, which is exposed to the request through the
+    admission_group context variable. Route handlers must run their MongoDB calls off
+    the event loop (sync handlers), so that in_flight reflects real concurrency.
+    """
+
+    def __init__(self, app, default_limit: int = 64, route_limits: Optional[dict[str, int]] = None,
+                 queue_size: int = 32, max_wait_seconds: float = 1.0, retry_after_seconds: int = 1,
+                 latency_source: Optional[Callable[[str], Optional[float]]] = None, target_latency_ms: float = 50.0,
+                 adjust_interval_seconds: float = 1.0, exempt_routes: Optional[set[str]] = None):
+        """Initialize the middleware.
+
+        Args:
+            app: The wrapped ASGI application.
+            default_limit (int): Concurrency limit shared by routes without their own limit.
+            route_limits (Optional[dict[str, int]]): Concurrency limits of dedicated routes, keyed by path.
+            queue_size (int): Maximum number of waiting requests per limiter.
+            max_wait_seconds (float): How long a request may wait in the queue.
+            retry_after_seconds (int): Value of the Retry-After header of shed requests.
+            latency_source (Optional[Callable[[str], Optional[float]]]): Returns the current MongoDB latency in ms
+                of a limiter's route group, or None without samples yet; disables adaptation if None.
+            target_latency_ms (float): MongoDB latency above which limits shrink.
+            adjust_interval_seconds (float): Minimum time between two limit adjustments.
+            exempt_routes (Optional[set[str]]): Paths never limited, e.g. long-lived event streams.
+
+        Returns:
+            None
+        """
+        self.app = app
+        self.default_limiter = ConcurrencyLimiter(
+            "default", default_limit, queue_size, max_wait_seconds)
+        self.route_limiters = {
+            route: ConcurrencyLimiter(route, limit, queue_size, max_wait_seconds)
+            for route, limit in (route_limits or {}).items()
+        }
+        self.retry_after_seconds = retry_after_seconds
+        self.latency_source = latency_source
+        self.target_latency_ms = target_latency_ms
+        self.adjust_interval_seconds = adjust_interval_seconds
+        self._last_adjustment = time.monotonic()
+        self.exempt_routes = exempt_routes or set()
+
+    def _maybe_adjust(self):
+        now = time.monotonic()
+        if self.latency_source is None or now - self._last_adjustment < self.adjust_interval_seconds:
+            return
+        self._last_adjustment = now
+        for limiter in (self.default_limiter, *self.route_limiters.values()):
+            latency_ms = self.latency_source(limiter.name)
+            if latency_ms is not None:
+                limiter.adjust(latency_ms, self.target_latency_ms)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_routes:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.route_limiters.get(scope["path"], self.default_limiter)
+        if not await limiter.acquire():
+            logger.warning("Shedding request to %s: %s in flight, limit %s",
+                           scope["path"], limiter.in_flight, limiter.limit)
+            await self._reject(send)
+            return
+        token = admission_group.set(limiter.name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_group.reset(token)
+            limiter.release()
+            self._maybe_adjust()
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": "Service overloaded, retry later"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"retry-after", str(self.retry_after_seconds).encode("ascii")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
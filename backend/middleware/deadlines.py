@@ -0,0 +1,86 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+import pymongo
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Lets a caller ask for a shorter deadline than the route default, in milliseconds
+DEADLINE_HEADER = b"x-request-deadline-ms"
+
+# Monotonic time at which the current request's deadline expires
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def remaining_deadline_seconds() -> Optional[float]:
+    """Return the time left before the current request's deadline, or None outside a request."""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def is_deadline_exceeded(error: Exception) -> bool:
+    """Check whether an error was raised because the request deadline expired.
+
+    Args:
+        error (Exception): The error raised by a service call.
+
+    Returns:
+        bool: True for pymongo client-side or server-side (maxTimeMS) timeouts.
+    """
+    return isinstance(error, PyMongoError) and error.timeout
+
+
+class DeadlineMiddleware:
+    """ASGI middleware that bounds every MongoDB operation of a request by a deadline.
+
+    The request runs inside pymongo.timeout(), so each operation gets the remaining
+    time as its maxTimeMS and client-side timeout, and fails once it is spent. The
+    deadline is the route default, optionally shortened by the X-Request-Deadline-Ms header.
+    """
+
+    def __init__(self, app, default_seconds: float = 5.0, route_seconds: Optional[dict[str, float]] = None):
+        """Initialize the middleware.
+
+        Args:
+            app: The wrapped ASGI application.
+            default_seconds (float): Deadline of routes without their own value.
+            route_seconds (Optional[dict[str, float]]): Deadlines per route path.
+
+        Returns:
+            None
+        """
+        self.app = app
+        self.default_seconds = default_seconds
+        self.route_seconds = route_seconds or {}
+
+    def _deadline_seconds(self, scope) -> float:
+        seconds = self.route_seconds.get(scope["path"], self.default_seconds)
+        for name, value in scope.get("headers", []):
+            if name == DEADLINE_HEADER:
+                try:
+                    requested = int(value) / 1000
+                except ValueError:
+                    logger.warning("Ignoring invalid %s header: %r", DEADLINE_HEADER.decode(), value)
+                    break
+                if requested > 0:
+                    seconds = min(seconds, requested)
+                break
+        return seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        seconds = self._deadline_seconds(scope)
+        token = request_deadline.set(time.monotonic() + seconds)
+        try:
+            with pymongo.timeout(seconds):
+                await self.app(scope, receive, send)
+        finally:
+            request_deadline.reset(token)
@@ -0,0 +1,243 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import json
+import logging
+from typing import Optional
+
+from pymongo.errors import PyMongoError
+
+from middleware.deadlines import is_deadline_exceeded, remaining_deadline_seconds
+from services.idempotency_service import IdempotencyService
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_HEADER = b"idempotency-key"
+IDEMPOTENCY_REPLAYED_HEADER = b"idempotent-replayed"
+
+# Response headers recomputed or not worth replaying
+_UNSTORED_HEADERS = {b"content-length", b"date", b"server"}
+
+
+async def _run_without_deadline(func, *args):
+    """Run a blocking call in a thread, outside the request's pymongo.timeout context.
+
+    Recording the outcome of a key must still succeed once the request deadline is spent.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(contextvars.Context().run, func, *args))
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware that makes retried writes safe through the Idempotency-Key header.
+
+    For the configured routes, the first request with a key is executed and its
+    response stored; retries with the same key get that response back, marked with
+    Idempotent-Replayed, without the write running again. Duplicates arriving while
+    the first request is still executing wait for it: in-process through a shared
+    future, across workers by polling the stored record. Server errors (5xx) are not
+    stored, so the client can retry them with the same key.
+
+    Waits never outlast the request deadline. If the key cannot be checked, the
+    request gets a 504 when the deadline expired, otherwise a 409 to retry.
+    """
+
+    def __init__(self, app, idempotency_service: IdempotencyService, routes: set[str],
+                 max_wait_seconds: float = 10.0, poll_interval_seconds: float = 0.1,
+                 max_key_length: int = 255):
+        """Initialize the middleware.
+
+        Args:
+            app: The wrapped ASGI application.
+            idempotency_service (IdempotencyService): Where keys and responses are recorded.
+            routes (set[str]): Paths that honour the Idempotency-Key header.
+            max_wait_seconds (float): How long a duplicate waits for the first execution before a 409.
+            poll_interval_seconds (float): How often a key pending in another worker is checked.
+            max_key_length (int): Longer keys are rejected with a 400.
+
+        Returns:
+            None
+        """
+        self.app = app
+        self.idempotency_service = idempotency_service
+        self.routes = routes
+        self.max_wait_seconds = max_wait_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.max_key_length = max_key_length
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.routes:
+            await self.app(scope, receive, send)
+            return
+
+        idempotency_key = None
+        for name, value in scope.get("headers", []):
+            if name == IDEMPOTENCY_KEY_HEADER:
+                idempotency_key = value.decode("latin-1").strip()
+                break
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > self.max_key_length:
+            await self._send_error(send, 400, "Idempotency-Key is too long")
+            return
+
+        body = await self._read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        key = f"{scope['path']}:{idempotency_key}"
+
+        wait_seconds = self.max_wait_seconds
+        remaining_seconds = remaining_deadline_seconds()
+        if remaining_seconds is not None:
+            wait_seconds = min(wait_seconds, remaining_seconds)
+
+        loop = asyncio.get_running_loop()
+        wait_until = loop.time() + wait_seconds
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(in_flight), wait_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+        # Retries of completed keys are answered from the cache, before any claim attempt
+        record = self.idempotency_service.get_cached(key)
+        if record is not None:
+            await self._replay(send, key, fingerprint, record)
+            return
+
+        try:
+            record = await asyncio.to_thread(self.idempotency_service.claim, key, fingerprint)
+            if record is not None:
+                record = await self._wait_for_record(
+                    key, fingerprint, record, max(0.0, wait_until - loop.time()))
+        except PyMongoError as e:
+            logger.error("Error checking idempotency key %s: %s", key, e)
+            if is_deadline_exceeded(e):
+                await self._send_error(send, 504, "Request deadline exceeded")
+            else:
+                await self._send_error(send, 409, "The Idempotency-Key could not be checked, retry it")
+            return
+        if record is not None:
+            await self._replay(send, key, fingerprint, record)
+            return
+
+        future = loop.create_future()
+        self._in_flight[key] = future
+        try:
+            await self._execute(scope, body, send, key)
+        finally:
+            del self._in_flight[key]
+            future.set_result(None)
+
+    async def _execute(self, scope, body: bytes, send, key: str):
+        """Run the request for a freshly claimed key and store its response."""
+        status_code = None
+        headers = []
+        chunks = []
+        body_sent = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if body_sent:
+                return {"type": "http.disconnect"}
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture_send(message):
+            nonlocal status_code, headers
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = [[name.decode("latin-1"), value.decode("latin-1")]
+                           for name, value in message.get("headers", [])
+                           if name.lower() not in _UNSTORED_HEADERS]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, capture_send)
+        except BaseException:
+            # Also on cancellation; if even this is lost, the claim's lease expires
+            await asyncio.shield(self._release(key))
+            raise
+
+        if status_code is None or status_code >= 500:
+            await self._release(key)
+            return
+        try:
+            await _run_without_deadline(
+                self.idempotency_service.complete, key, status_code, headers, b"".join(chunks))
+        except Exception as e:
+            # The response was already sent; a retry will find the key pending and get a 409
+            logger.error("Error storing the response of idempotency key %s: %s", key, e)
+
+    async def _release(self, key: str):
+        """Release a key whose request failed, logging rather than masking the original error."""
+        try:
+            await _run_without_deadline(self.idempotency_service.release, key)
+        except Exception as e:
+            logger.error("Error releasing idempotency key %s: %s", key, e)
+
+    async def _wait_for_record(self, key: str, fingerprint: str, record: dict,
+                               wait_seconds: float) -> Optional[dict]:
+        """Wait up to wait_seconds for a key pending in another worker.
+
+        The key is claimed again on each poll, so that it is taken over if the other
+        execution released it or its lease expired.
+
+        Returns:
+            Optional[dict]: The latest record, or None if this request now holds the claim.
+        """
+        waited = 0.0
+        while (record is not None and record["Status"] == "pending"
+               and record["Fingerprint"] == fingerprint and waited < wait_seconds):
+            await asyncio.sleep(self.poll_interval_seconds)
+            waited += self.poll_interval_seconds
+            record = await asyncio.to_thread(self.idempotency_service.claim, key, fingerprint)
+        return record
+
+    async def _replay(self, send, key: str, fingerprint: str, record: dict):
+        """Answer a duplicate request from the stored record of its key."""
+        if record["Fingerprint"] != fingerprint:
+            await self._send_error(send, 422, "Idempotency-Key was already used for a different request")
+            return
+        if record["Status"] == "pending":
+            await self._send_error(send, 409, "A request with this Idempotency-Key is still in progress")
+            return
+
+        logger.info("Replaying stored response for idempotency key %s", key)
+        body = bytes(record["ResponseBody"])
+        headers = [(name.encode("latin-1"), value.encode("latin-1"))
+                   for name, value in record["ResponseHeaders"]]
+        headers.append((b"content-length", str(len(body)).encode()))
+        headers.append((IDEMPOTENCY_REPLAYED_HEADER, b"true"))
+        await send({"type": "http.response.start", "status": record["ResponseStatus"], "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _read_body(self, receive) -> bytes:
+        """Read the whole request body, so that it can be fingerprinted and replayed."""
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _send_error(self, send, status_code: int, detail: str):
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,208 @@
+import asyncio
+import cProfile
+import functools
+import hmac
+import logging
+import marshal
+import pstats
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+# Requests carrying the profiling token in this header are profiled
+PROFILE_TOKEN_HEADER = b"x-profile-token"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# Profilers of the sync route handlers of the request being profiled, run in threadpool threads
+_thread_profilers: ContextVar[Optional[list]] = ContextVar("thread_profilers", default=None)
+
+
+def profile_in_thread(func):
+    """Wrap a sync route handler so that it is profiled in its threadpool thread when requested.
+
+    cProfile only follows the thread it was enabled in, so the handler gets its own
+    profiler, merged into the request profile by ProfilingMiddleware.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profilers = _thread_profilers.get()
+        if profilers is None:
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profilers.append(profiler)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose sync endpoints are wrapped with profile_in_thread.
+
+    Set it as the app's router.route_class before routes are declared.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if not asyncio.iscoroutinefunction(endpoint):
+            endpoint = profile_in_thread(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+class ProfileStore:
+    """This class keeps the most recent request profiles in memory, for download.
+
+    Profiles are kept in the pstats format written by cProfile (load them with
+    pstats.Stats, snakeviz or any pstats viewer). The store also enforces the
+    profiling caps: one profile at a time, and at most one per min_interval_seconds.
+    """
+
+    def __init__(self, token: str, max_profiles: int = 20, min_interval_seconds: float = 10.0):
+        """Initialize the ProfileStore.
+
+        Args:
+            token (str): The secret that authorizes profiling and downloads.
+            max_profiles (int): How many profiles are kept; older ones are dropped.
+            min_interval_seconds (float): Minimum time between the start of two profiles.
+
+        Returns:
+            None
+        """
+        self.token = token.encode("utf-8")
+        self.min_interval_seconds = min_interval_seconds
+        self.profiles: deque[dict] = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+        self._running = False
+        self._last_started = float("-inf")
+
+    def is_authorized(self, token: Optional[bytes]) -> bool:
+        """Check a token against the profiling secret, in constant time."""
+        return bool(self.token) and token is not None and hmac.compare_digest(token, self.token)
+
+    def try_start(self) -> bool:
+        """Reserve the profiler, unless a profile is running or the rate cap is reached."""
+        with self._lock:
+            now = time.monotonic()
+            if self._running or now - self._last_started < self.min_interval_seconds:
+                return False
+            self._running = True
+            self._last_started = now
+            return True
+
+    def finish(self, profile_id: str, method: str, path: str, status_code: Optional[int],
+               duration_ms: float, profiler: cProfile.Profile,
+               thread_profilers: tuple[cProfile.Profile, ...] = ()):
+        """Store a finished profile, merged with those of its threadpool work, and release the profiler."""
+        try:
+            stats = pstats.Stats(profiler)
+            for thread_profiler in thread_profilers:
+                stats.add(thread_profiler)
+            self.profiles.append({
+                "id": profile_id,
+                "method": method,
+                "path": path,
+                "status_code": status_code,
+                "duration_ms": round(duration_ms, 3),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "data": marshal.dumps(stats.stats)
+            })
+        finally:
+            with self._lock:
+                self._running = False
+
+    def list(self) -> list[dict]:
+        """Return the stored profiles without their data, newest first."""
+        return [{key: value for key, value in profile.items() if key != "data"}
+                for profile in reversed(self.profiles)]
+
+    def get(self, profile_id: str) -> Optional[bytes]:
+        """Return the pstats data of a stored profile, or None if it was dropped."""
+        for profile in self.profiles:
+            if profile["id"] == profile_id:
+                return profile["data"]
+        return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that runs cProfile around requests carrying the profiling token.
+
+    The profile covers everything below this middleware: body parsing, validation,
+    the service calls and the response encoding. The profiler is deterministic and
+    per-thread: sync route handlers, run in the threadpool, are profiled in their
+    thread through ProfiledRoute and merged in. Work of other requests interleaved on
+    the event loop during an await is counted too; profile when the worker is quiet
+    for the cleanest result. Requests over the rate cap run unprofiled.
+    """
+
+    def __init__(self, app, profile_store: ProfileStore, exempt_path_prefixes: tuple[str, ...] = ()):
+        """Initialize the middleware.
+
+        Args:
+            app: The wrapped ASGI application.
+            profile_store (ProfileStore): Where profiles are kept, shared with the admin endpoints.
+            exempt_path_prefixes (tuple[str, ...]): Paths never profiled, with everything under them,
+                e.g. the admin endpoints that read the profiles with the same token.
+
+        Returns:
+            None
+        """
+        self.app = app
+        self.profile_store = profile_store
+        self.exempt_path_prefixes = exempt_path_prefixes
+
+    def _is_exempt(self, path: str) -> bool:
+        return any(path == prefix or path.startswith(prefix + "/") for prefix in self.exempt_path_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._is_exempt(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        token = None
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_TOKEN_HEADER:
+                token = value
+                break
+        if token is None or not self.profile_store.is_authorized(token):
+            await self.app(scope, receive, send)
+            return
+        if not self.profile_store.try_start():
+            logger.info("Profiling of %s skipped: a profile is running or the rate cap was reached",
+                        scope["path"])
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        status_code = None
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", []),
+                                      (PROFILE_ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        thread_profilers = []
+        token = _thread_profilers.set(thread_profilers)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.disable()
+            _thread_profilers.reset(token)
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.profile_store.finish(profile_id, scope["method"], scope["path"],
+                                      status_code, duration_ms, profiler, tuple(thread_profilers))
+            logger.info("Stored profile %s of %s (%.1f ms)", profile_id, scope["path"], duration_ms)
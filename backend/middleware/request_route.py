@@ -0,0 +1,31 @@
+from utils.logging_config import request_route
+
+
+class RequestRouteMiddleware:
+    """ASGI middleware that exposes the request path to the logging filters.
+
+    Records logged while the request is handled, uvicorn's access log line included,
+    are sampled and tagged by this route.
+    """
+
+    def __init__(self, app):
+        """Initialize the middleware.
+
+        Args:
+            app: The wrapped ASGI application.
+
+        Returns:
+            None
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = request_route.set(scope["path"])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_route.reset(token)
@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Mapping, Optional
+
+from bson import ObjectId
+
+
+@dataclass(slots=True)
+class AccountDate:
+    """Opening and closing dates of an account."""
+    opening_date: datetime
+    closing_date: Optional[datetime] = None
+
+    @classmethod
+    def from_bson(cls, doc: Mapping) -> "AccountDate":
+        """Build an AccountDate from its BSON sub-document."""
+        return cls(doc["OpeningDate"], doc.get("ClosingDate"))
+
+    def to_dict(self) -> dict:
+        """Return the sub-document with its MongoDB field names."""
+        doc = {"OpeningDate": self.opening_date}
+        if self.closing_date is not None:
+            doc["ClosingDate"] = self.closing_date
+        return doc
+
+
+@dataclass(slots=True)
+class AccountUser:
+    """Reference from an account to the user that owns it."""
+    user_name: str
+    user_id: ObjectId
+
+    @classmethod
+    def from_bson(cls, doc: Mapping) -> "AccountUser":
+        """Build an AccountUser from its BSON sub-document."""
+        return cls(doc["UserName"], doc["UserId"])
+
+    def to_dict(self) -> dict:
+        """Return the sub-document with its MongoDB field names."""
+        return {"UserName": self.user_name, "UserId": self.user_id}
+
+
+@dataclass(slots=True)
+class Account:
+    """A document of the accounts collection."""
+    id: ObjectId
+    account_number: str
+    account_bank: str
+    account_status: str
+    account_date: AccountDate
+    account_type: str
+    account_balance: float
+    account_currency: str
+    account_user: AccountUser
+    account_identification_type: Optional[str] = None
+    account_description: Optional[str] = None
+    last_modified: Optional[datetime] = None
+
+    @classmethod
+    def from_bson(cls, doc: Mapping) -> "Account":
+        """Build an Account from a document read from MongoDB.
+
+        Args:
+            doc (Mapping): The account document.
+
+        Returns:
+            Account: The typed account.
+        """
+        return cls(
+            doc["_id"],
+            doc["AccountNumber"],
+            doc["AccountBank"],
+            doc["AccountStatus"],
+            AccountDate.from_bson(doc["AccountDate"]),
+            doc["AccountType"],
+            doc["AccountBalance"],
+            doc["AccountCurrency"],
+            AccountUser.from_bson(doc["AccountUser"]),
+            doc.get("AccountIdentificationType"),
+            doc.get("AccountDescription"),
+            doc.get("LastModified"),
+        )
+
+    def to_dict(self) -> dict:
+        """Return the account as a document with its MongoDB field names.
+
+        Returns:
+            dict: The account document.
+        """
+        doc = {
+            "_id": self.id,
+            "AccountNumber": self.account_number,
+            "AccountBank": self.account_bank,
+            "AccountStatus": self.account_status,
+        }
+        if self.account_identification_type is not None:
+            doc["AccountIdentificationType"] = self.account_identification_type
+        doc["AccountDate"] = self.account_date.to_dict()
+        doc["AccountType"] = self.account_type
+        doc["AccountBalance"] = self.account_balance
+        doc["AccountCurrency"] = self.account_currency
+        if self.account_description is not None:
+            doc["AccountDescription"] = self.account_description
+        doc["AccountUser"] = self.account_user.to_dict()
+        if self.last_modified is not None:
+            doc["LastModified"] = self.last_modified
+        return doc
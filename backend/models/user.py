@@ -0,0 +1,161 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Mapping, Optional
+
+from bson import ObjectId
+
+
+@dataclass(slots=True)
+class UserName:
+    """Name of a user."""
+    first_name: str
+    last_name: str
+    name_prefix: str
+
+    @classmethod
+    def from_bson(cls, doc: Mapping) -> "UserName":
+        """Build a UserName from its BSON sub-document."""
+        return cls(doc["FirstName"], doc["LastName"], doc["NamePrefix"])
+
+    def to_dict(self) -> dict:
+        """Return the sub-document with its MongoDB field names."""
+        return {"FirstName": self.first_name, "LastName": self.last_name, "NamePrefix": self.name_prefix}
+
+
+@dataclass(slots=True)
+class UserAddress:
+    """Residential address of a user."""
+    street_and_number: str
+    postal_code: str
+    city: str
+    country: str
+    state: str
+
+    @classmethod
+    def from_bson(cls, doc: Mapping) -> "UserAddress":
+        """Build a UserAddress from its BSON sub-document."""
+        return cls(doc["StreetAndNumber"], doc["PostalCode"], doc["City"], doc["Country"], doc["State"])
+
+    def to_dict(self) -> dict:
+        """Return the sub-document with its MongoDB field names."""
+        return {
+            "StreetAndNumber": self.street_and_number,
+            "PostalCode": self.postal_code,
+            "City": self.city,
+            "Country": self.country,
+            "State": self.state,
+        }
+
+
+@dataclass(slots=True)
+class AccountSummary:
+    """Account counts and total balance of a user, maintained on account writes."""
+    active_accounts: int = 0
+    closed_accounts: int = 0
+    total_balance: float = 0.0
+    by_type: dict[str, dict[str, int]] = field(default_factory=dict)
+
+    @classmethod
+    def from_bson(cls, doc: Mapping) -> "AccountSummary":
+        """Build an AccountSummary from its BSON sub-document."""
+        return cls(
+            doc.get("ActiveAccounts", 0),
+            doc.get("ClosedAccounts", 0),
+            doc.get("TotalBalance", 0.0),
+            doc.get("ByType", {}),
+        )
+
+    def to_dict(self) -> dict:
+        """Return the sub-document with its MongoDB field names."""
+        return {
+            "ActiveAccounts": self.active_accounts,
+            "ClosedAccounts": self.closed_accounts,
+            "TotalBalance": self.total_balance,
+            "ByType": self.by_type,
+        }
+
+
+# Top-level fields of a user document that User models
+USER_FIELDS = frozenset({
+    "_id", "UserName", "UserEmail", "UserIdentification", "Name", "ResidentialStatus",
+    "CivilStatus", "BirthDate", "Nationality", "JobTitle", "UserAddress",
+    "LinkedAccounts", "RecentTransactions", "AccountSummary",
+})
+
+
+@dataclass(slots=True)
+class User:
+    """A document of the users collection.
+
+    Users are written outside this service, so top-level fields it does not model are
+    kept in extra and written back by to_dict.
+    """
+    id: ObjectId
+    user_name: str
+    user_email: str
+    user_identification: str
+    name: UserName
+    residential_status: str
+    civil_status: str
+    birth_date: datetime
+    nationality: str
+    job_title: str
+    user_address: UserAddress
+    linked_accounts: list[ObjectId] = field(default_factory=list)
+    recent_transactions: list[dict] = field(default_factory=list)
+    account_summary: Optional[AccountSummary] = None
+    extra: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_bson(cls, doc: Mapping) -> "User":
+        """Build a User from a document read from MongoDB.
+
+        Args:
+            doc (Mapping): The user document.
+
+        Returns:
+            User: The typed user.
+        """
+        return cls(
+            doc["_id"],
+            doc["UserName"],
+            doc["UserEmail"],
+            doc["UserIdentification"],
+            UserName.from_bson(doc["Name"]),
+            doc["ResidentialStatus"],
+            doc["CivilStatus"],
+            doc["BirthDate"],
+            doc["Nationality"],
+            doc["JobTitle"],
+            UserAddress.from_bson(doc["UserAddress"]),
+            doc.get("LinkedAccounts", []),
+            doc.get("RecentTransactions", []),
+            AccountSummary.from_bson(doc["AccountSummary"]) if "AccountSummary" in doc else None,
+            {key: value for key, value in doc.items() if key not in USER_FIELDS},
+        )
+
+    def to_dict(self) -> dict:
+        """Return the user as a document with its MongoDB field names.
+
+        Returns:
+            dict: The user document.
+        """
+        doc = {
+            "_id": self.id,
+            "UserName": self.user_name,
+            "UserEmail": self.user_email,
+            "UserIdentification": self.user_identification,
+            "Name": self.name.to_dict(),
+            "ResidentialStatus": self.residential_status,
+            "CivilStatus": self.civil_status,
+            "BirthDate": self.birth_date,
+            "Nationality": self.nationality,
+            "JobTitle": self.job_title,
+            "UserAddress": self.user_address.to_dict(),
+            "LinkedAccounts": self.linked_accounts,
+            "RecentTransactions": self.recent_transactions,
+        }
+        if self.account_summary is not None:
+            doc["AccountSummary"] = self.account_summary.to_dict()
+        doc.update(self.extra)
+        return doc
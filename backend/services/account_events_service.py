@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Optional
+
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+from database.connection import MongoDBConnection
+from models.account import Account
+
+logger = logging.getLogger(__name__)
+
+# Account lifecycle changes: inserts, and updates that close an account
+_LIFECYCLE_PIPELINE = [
+    {"$match": {"$or": [
+        {"operationType": "insert"},
+        {"operationType": "update", "updateDescription.updatedFields.AccountStatus": "Closed"}
+    ]}}
+]
+
+
+class AccountEventsService:
+    """This class fans out account lifecycle events (created, closed) to per-user subscribers.
+
+    A single change stream on the accounts collection is watched per worker, in a
+    background thread started with the first subscriber. Each event is dispatched on
+    the event loop to the asyncio queues of the account owner's subscribers.
+    """
+
+    def __init__(self, connection: MongoDBConnection, db_name: str, accounts_collection_name: str,
+                 queue_size: int = 100, retry_seconds: float = 5.0):
+        """Initialize the AccountEventsService.
+
+        Args:
+            connection (MongoDBConnection): The MongoDB connection instance. Use one without
+                command listeners, since idle change stream getMores block for max_await_time_ms.
+            db_name (str): The name of the database.
+            accounts_collection_name (str): The name of the accounts collection.
+            queue_size (int): Events buffered per subscriber; the oldest are dropped beyond it. Defaults to 100.
+            retry_seconds (float): Delay before the watcher resumes after an error. Defaults to 5.
+
+        Returns:
+            None
+        """
+        self.accounts_collection = connection.get_collection(
+            db_name, accounts_collection_name)
+        self.queue_size = queue_size
+        self.retry_seconds = retry_seconds
+        self._subscribers: dict[ObjectId, set[asyncio.Queue]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def subscribe(self, user_id: ObjectId) -> asyncio.Queue:
+        """Register a subscriber for a user's account events.
+
+        Must be called from the event loop. Starts the change stream watcher if needed.
+
+        Args:
+            user_id (ObjectId): The ObjectId of the user.
+
+        Returns:
+            asyncio.Queue: The queue receiving the user's events as {"event", "account"} dicts.
+        """
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[user_id].add(queue)
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._watch, name="account-events-watcher", daemon=True)
+            self._thread.start()
+        return queue
+
+    def unsubscribe(self, user_id: ObjectId, queue: asyncio.Queue):
+        """Remove a subscriber registered with subscribe().
+
+        Args:
+            user_id (ObjectId): The ObjectId of the user.
+            queue (asyncio.Queue): The queue returned by subscribe().
+
+        Returns:
+            None
+        """
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def stop(self):
+        """Stop the change stream watcher, if running."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.retry_seconds)
+            self._thread = None
+
+    def _dispatch(self, user_id: ObjectId, event: dict):
+        """Deliver an event to the user's subscribers. Runs on the event loop."""
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                # Slow consumer: drop its oldest event rather than block the others
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def _publish(self, change: dict):
+        """Decode a lifecycle change and hand its event to the event loop for dispatch."""
+        account = Account.from_bson(change["fullDocument"])
+        event = {
+            "event": "created" if change["operationType"] == "insert" else "closed",
+            "account": account
+        }
+        self._loop.call_soon_threadsafe(
+            self._dispatch, account.account_user.user_id, event)
+
+    def _watch(self):
+        """Follow the accounts change stream until stop() is called, resuming after errors."""
+        resume_token = None
+        while not self._stop.is_set():
+            try:
+                with self.accounts_collection.watch(
+                        _LIFECYCLE_PIPELINE, full_document="updateLookup",
+                        resume_after=resume_token, max_await_time_ms=1000) as stream:
+                    logger.info("Watching account lifecycle events")
+                    while not self._stop.is_set():
+                        change = stream.try_next()
+                        resume_token = stream.resume_token
+                        if change is None or change.get("fullDocument") is None:
+                            continue
+                        try:
+                            self._publish(change)
+                        except Exception as e:
+                            # e.g. an account stored by another writer without a modeled
+                            # field; skip it rather than stop the watcher for every client
+                            logger.error("Skipping account change %s: %s",
+                                         change["fullDocument"].get("_id"), e)
+            except PyMongoError as e:
+                if getattr(e, "code", None) == 286:
+                    # ChangeStreamHistoryLost: the resume point left the oplog, start from now
+                    resume_token = None
+                logger.error("Account events change stream failed, retrying in %ss: %s",
+                             self.retry_seconds, e)
+                self._stop.wait(self.retry_seconds)
@@ -0,0 +1,74 @@
+import logging
+import threading
+
+from pymongo import ReturnDocument
+from pymongo.collection import Collection
+
+logger = logging.getLogger(__name__)
+
+# Allocated account numbers are zero-padded to this many digits, like the existing ones
+ACCOUNT_NUMBER_DIGITS = 9
+
+
+class AccountNumberAllocator:
+    """This class hands out unique account numbers from blocks reserved on a counter document.
+
+    The counter holds the highest number reserved by any worker. Each worker reserves
+    a block of numbers with a single atomic $inc and serves them from memory, so most
+    account creations need no round trip for numbering, and two workers can never
+    allocate the same number. Numbers left in a block when a worker stops are skipped.
+    """
+
+    def __init__(self, counters_collection: Collection, counter_id: str = "AccountNumber",
+                 block_size: int = 100):
+        """Initialize the AccountNumberAllocator.
+
+        Args:
+            counters_collection (Collection): The collection of counter documents.
+            counter_id (str): The _id of the counter document. Defaults to "AccountNumber".
+            block_size (int): How many numbers are reserved at once. Defaults to 100.
+
+        Returns:
+            None
+        """
+        self.counters_collection = counters_collection
+        self.counter_id = counter_id
+        self.block_size = block_size
+        self._next = 0
+        self._block_end = 0
+        self._lock = threading.Lock()
+
+    def is_seeded(self) -> bool:
+        """Check whether the counter document exists."""
+        return self.counters_collection.find_one({"_id": self.counter_id}, {"_id": 1}) is not None
+
+    def seed(self, minimum: int):
+        """Make sure the counter is at least minimum, e.g. the highest existing account number.
+
+        Args:
+            minimum (int): The lowest value the counter may have.
+
+        Returns:
+            None
+        """
+        self.counters_collection.update_one(
+            {"_id": self.counter_id}, {"$max": {"Value": minimum}}, upsert=True)
+
+    def allocate(self) -> str:
+        """Return the next account number, reserving a new block when the current one is used up.
+
+        Returns:
+            str: The account number, zero-padded to ACCOUNT_NUMBER_DIGITS digits.
+        """
+        with self._lock:
+            if self._next >= self._block_end:
+                counter = self.counters_collection.find_one_and_update(
+                    {"_id": self.counter_id},
+                    {"$inc": {"Value": self.block_size}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER)
+                self._block_end = counter["Value"]
+                self._next = self._block_end - self.block_size
+                logger.debug("Reserved account numbers %s to %s", self._next + 1, self._block_end)
+            self._next += 1
+            return str(self._next).zfill(ACCOUNT_NUMBER_DIGITS)
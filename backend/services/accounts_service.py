@@ -1,26 +1,106 @@
+import base64
+import json
+
 from bson import ObjectId
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import ASCENDING
+from pymongo.client_session import ClientSession
+from pymongo.errors import BulkWriteError
 from typing import Union, Optional
 from database.connection import MongoDBConnection
-from datetime import datetime, timezone
+from database.schema_validator import SchemaValidator
+from database.schemas import ACCOUNTS_JSON_SCHEMA
+from models.account import Account, AccountDate, AccountUser
+from services.account_number_allocator import AccountNumberAllocator
+from utils.lru_cache import TTLCache
+from datetime import datetime, timedelta, timezone
 
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Server error code of a duplicate key
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _encode_change_token(last_modified: datetime, account_id: ObjectId) -> str:
+    """Encode the position after an account in the changes feed as an opaque token."""
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    position = {"t": int(last_modified.timestamp() * 1000), "id": str(account_id)}
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def _decode_change_token(token: str) -> tuple[datetime, ObjectId]:
+    """Decode a changes feed token into its (LastModified, _id) position.
+
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return (datetime.fromtimestamp(position["t"] / 1000, timezone.utc),
+                ObjectId(position["id"]))
+    except Exception as e:
+        raise ValueError("Invalid changes token.") from e
+
+
+def _encode_balance_token(account_balance: float, account_id: ObjectId) -> str:
+    """Encode the position after an account in the (AccountBalance, _id) order as an opaque token."""
+    position = {"b": account_balance, "id": str(account_id)}
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def _decode_balance_token(token: str) -> tuple[float, ObjectId]:
+    """Decode a query token into its (AccountBalance, _id) position.
+
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return float(position["b"]), ObjectId(position["id"])
+    except Exception as e:
+        raise ValueError("Invalid query token.") from e
+
+
+def _sum_for_type(by_type: str, field_name: str) -> dict:
+    """Build the expression summing a field of the $$type entries of a grouped-by-type array."""
+    return {"$sum": {"$map": {
+        "input": {"$filter": {"input": by_type, "cond": {"$eq": ["$$this._id", "$$type"]}}},
+        "in": f"$$this.{field_name}"
+    }}}
 
 
 class AccountsService:
     """This class provides methods to interact with accounts in the database."""
 
-    def __init__(self, connection: MongoDBConnection, db_name: str, accounts_collection_name: str, users_collection_name: str):
+    def __init__(self, connection: MongoDBConnection, db_name: str, accounts_collection_name: str, users_collection_name: str,
+                 bulk_read_preference=None, accounts_archive_collection_name: str = "accounts_archive",
+                 counters_collection_name: str = "counters", account_number_block_size: int = 100,
+                 user_id_cache_size: int = 10000, user_id_cache_ttl_seconds: float = 300.0):
         """Initialize the AccountService with the MongoDB connection and collection names.
 
+        Lookups and writes always use the primary, so they observe the latest writes.
+        Full-collection lists use bulk_read_preference, e.g. secondaryPreferred with
+        maxStalenessSeconds, to keep those scans off the primary.
+
+        Accounts closed for a while are moved to the archive collection by
+        archive_closed_accounts, so that the accounts collection and its indexes
+        only hold the working set.
+
         Args:
             connection (MongoDBConnection): The MongoDB connection instance.
             db_name (str): The name of the database.
             accounts_collection_name (str): The name of the accounts collection.
             users_collection_name (str): The name of the users collection.
+            bulk_read_preference (Optional[_ServerMode]): The read preference for bulk lists. Defaults to primary.
+            accounts_archive_collection_name (str): The name of the collection of archived closed accounts.
+            counters_collection_name (str): The name of the collection holding the account number counter.
+            account_number_block_size (int): How many account numbers a worker reserves at once.
+            user_id_cache_size (int): How many UserName to UserId resolutions are cached.
+            user_id_cache_ttl_seconds (float): How long a cached resolution is trusted.
 
         Returns:
             None
@@ -29,94 +109,200 @@ class AccountsService:
             db_name, accounts_collection_name)
         self.users_collection = connection.get_collection(
             db_name, users_collection_name)
+        # In-process copy of the collection validator, compiled once
+        self.account_validator = SchemaValidator(ACCOUNTS_JSON_SCHEMA)
+        # Same collection, routed with the bulk read preference
+        self.bulk_accounts_collection = connection.get_collection(
+            db_name, accounts_collection_name, read_preference=bulk_read_preference)
+        # Same collection, returning undecoded RawBSONDocument for passthrough bulk reads
+        self.raw_accounts_collection = connection.get_collection(
+            db_name, accounts_collection_name,
+            codec_options=CodecOptions(document_class=RawBSONDocument),
+            read_preference=bulk_read_preference)
+        # UserName to UserId resolutions, so that per-user queries always filter on
+        # AccountUser.UserId, the shard key, and target a single shard
+        self.user_id_cache = TTLCache(user_id_cache_size, user_id_cache_ttl_seconds)
+        # Account numbers are allocated by the service, from blocks reserved on a counter
+        self.account_number_allocator = AccountNumberAllocator(
+            connection.get_collection(db_name, counters_collection_name),
+            block_size=account_number_block_size)
+        # Archived closed accounts, with the same bulk and raw variants
+        self.archive_collection = connection.get_collection(
+            db_name, accounts_archive_collection_name)
+        self.bulk_archive_collection = connection.get_collection(
+            db_name, accounts_archive_collection_name, read_preference=bulk_read_preference)
+        self.raw_archive_collection = connection.get_collection(
+            db_name, accounts_archive_collection_name,
+            codec_options=CodecOptions(document_class=RawBSONDocument),
+            read_preference=bulk_read_preference)
 
-    def get_accounts(self) -> list[dict]:
+    def get_accounts(self, raw: bool = False, include_archived: bool = False) -> Union[list[Account], list[RawBSONDocument]]:
         """Retrieve all accounts, optionally excluding a specific account.
-        
+
+        Args:
+            raw (bool): Return undecoded RawBSONDocument instances instead of Account models. Defaults to False.
+            include_archived (bool): Also return the archived closed accounts. Defaults to False.
+
         Returns:
-            list[dict]: A list of all accounts.
+            Union[list[Account], list[RawBSONDocument]]: A list of all accounts.
         """
-        accounts = list(self.accounts_collection.find({}))
+        if raw:
+            accounts = list(self.raw_accounts_collection.find({}))
+            if include_archived:
+                accounts.extend(self.raw_archive_collection.find({}))
+            return accounts
+        accounts = [Account.from_bson(doc)
+                    for doc in self.bulk_accounts_collection.find({})]
+        if include_archived:
+            accounts.extend(Account.from_bson(doc)
+                            for doc in self.bulk_archive_collection.find({}))
         return accounts
 
-    def get_active_accounts(self) -> list[dict]:
+    def get_active_accounts(self) -> list[Account]:
         """Retrieve all active accounts, optionally excluding a specific account.
         
         Returns:
-            list[dict]: A list of all active accounts.
+            list[Account]: A list of all active accounts.
         """
         # Fetch accounts where 'AccountStatus' is 'Active'
         query = {"AccountStatus": "Active"}
-        accounts = list(self.accounts_collection.find(query))
+        accounts = [Account.from_bson(doc)
+                    for doc in self.bulk_accounts_collection.find(query)]
         return accounts
 
-    def get_account_by_number(self, account_number: str) -> Optional[dict]:
+    def query_accounts(self, account_status: Optional[str] = "Active", account_type: Optional[str] = None,
+                       min_balance: Optional[float] = None, max_balance: Optional[float] = None,
+                       opened_after: Optional[datetime] = None, opened_before: Optional[datetime] = None,
+                       limit: int = 100, token: Optional[str] = None) -> tuple[list[Account], Optional[str], bool]:
+        """Retrieve the accounts matching range filters, ordered by AccountBalance then _id.
+
+        Served from the {AccountStatus, AccountBalance, _id, AccountDate.OpeningDate} index,
+        or the {AccountStatus, AccountType, AccountBalance, _id, AccountDate.OpeningDate}
+        index when an account type is given, so only matching index keys are scanned and
+        the order needs no sort. Queries over any status walk the
+        {AccountBalance, _id, AccountDate.OpeningDate} index instead. The opening date
+        range is checked on the index keys, so only matching documents are fetched.
+        Pages are chained with keyset tokens. Archived accounts are not included.
+
+        Args:
+            account_status (Optional[str]): Only accounts with this status; None for any status. Defaults to "Active".
+            account_type (Optional[str]): Only accounts of this type.
+            min_balance (Optional[float]): Only accounts with at least this balance.
+            max_balance (Optional[float]): Only accounts with at most this balance.
+            opened_after (Optional[datetime]): Only accounts opened at or after this date.
+            opened_before (Optional[datetime]): Only accounts opened before this date.
+            limit (int): The maximum number of accounts to return. Defaults to 100.
+            token (Optional[str]): The token returned by the previous call, None for the first page.
+
+        Returns:
+            tuple[list[Account], Optional[str], bool]: The accounts, the token of the next
+                page, and whether more accounts match.
+
+        Raises:
+            ValueError: If the token is malformed.
+        """
+        query = {}
+        if account_status is not None:
+            query["AccountStatus"] = account_status
+        if account_type is not None:
+            query["AccountType"] = account_type
+        balance_range = {}
+        if min_balance is not None:
+            balance_range["$gte"] = min_balance
+        if max_balance is not None:
+            balance_range["$lte"] = max_balance
+        if balance_range:
+            query["AccountBalance"] = balance_range
+        opening_range = {}
+        if opened_after is not None:
+            opening_range["$gte"] = opened_after
+        if opened_before is not None:
+            opening_range["$lt"] = opened_before
+        if opening_range:
+            query["AccountDate.OpeningDate"] = opening_range
+        if token:
+            account_balance, account_id = _decode_balance_token(token)
+            query["$or"] = [
+                {"AccountBalance": {"$gt": account_balance}},
+                {"AccountBalance": account_balance, "_id": {"$gt": account_id}}
+            ]
+
+        docs = list(self.bulk_accounts_collection.find(query)
+                    .sort([("AccountBalance", ASCENDING), ("_id", ASCENDING)])
+                    .limit(limit + 1))
+        has_more = len(docs) > limit
+        accounts = [Account.from_bson(doc) for doc in docs[:limit]]
+        next_token = None
+        if has_more:
+            last = accounts[-1]
+            next_token = _encode_balance_token(last.account_balance, last.id)
+        logger.debug("Query matched %s accounts", len(accounts))
+        return accounts, next_token, has_more
+
+    def get_account_by_number(self, account_number: str, session: Optional[ClientSession] = None) -> Optional[Account]:
         """Retrieve an account by its number.
         Args:
             account_number (str): The account number to search for.
+            session (Optional[ClientSession]): A causally consistent session for read-your-writes flows.
         Returns:
-            Optional[dict]: The account document if found, otherwise None.
+            Optional[Account]: The account if found, otherwise None.
         """
-        account = self.accounts_collection.find_one(
-            {"AccountNumber": account_number})
-        if account:
-            logging.info(f"Account found with number {account_number}")
-        else:
-            logging.info(f"No account found with number {account_number}")
-        return account
+        doc = self.accounts_collection.find_one(
+            {"AccountNumber": account_number}, session=session)
+        if doc:
+            logger.debug("Account found with number %s", account_number)
+            return Account.from_bson(doc)
+        logger.debug("No account found with number %s", account_number)
+        return None
 
-    def get_active_account_by_number(self, account_number: str) -> Optional[dict]:
+    def get_active_account_by_number(self, account_number: str, session: Optional[ClientSession] = None) -> Optional[Account]:
         """Retrieve an active account by its number.
         Args:
             account_number (str): The account number to search for.
+            session (Optional[ClientSession]): A causally consistent session for read-your-writes flows.
         Returns:
-            Optional[dict]: The active account document if found, otherwise None.
+            Optional[Account]: The active account if found, otherwise None.
         """
-        account = self.accounts_collection.find_one(
-            {"AccountNumber": account_number, "AccountStatus": "Active"})
-        if account:
-            logging.info(f"Active account found with number {account_number}")
-        else:
-            logging.info(
-                f"No active account found with number {account_number}")
-        return account
+        doc = self.accounts_collection.find_one(
+            {"AccountNumber": account_number, "AccountStatus": "Active"}, session=session)
+        if doc:
+            logger.debug("Active account found with number %s", account_number)
+            return Account.from_bson(doc)
+        logger.debug("No active account found with number %s", account_number)
+        return None
 
-    def create_account(self, account_number: str, account_balance: float, account_type: str, user_name: str, user_id: str) -> ObjectId:
-        """Create an account and return its ID.
+    def create_account(self, account_balance: float, account_type: str, user_name: str, user_id: str,
+                       session: Optional[ClientSession] = None) -> tuple[ObjectId, str]:
+        """Create an account, with a newly allocated account number, and return its ID and number.
         Args:
-            account_number (str): The account number.
             account_balance (float): The initial account balance.
             account_type (str): The type of account.
             user_name (str): The username of the user.
             user_id (str): The ObjectId of the user.
+            session (Optional[ClientSession]): A causally consistent session for read-your-writes flows.
         Returns:
-            ObjectId: The ID of the newly created account.
+            tuple[ObjectId, str]: The ID and the account number of the newly created account.
 
         Raises:
-            ValueError: If the user_id or username is invalid, the account balance is invalid, or the account number already exists.
+            ValueError: If the user_id or username is invalid, or the account balance is invalid.
         """
 
         # Validate and convert user_id to ObjectId
-        user_id_obj = ObjectId(user_id)
-
-        # Check if the user exists in the users collection
-        user = self.users_collection.find_one(
-            {"_id": user_id_obj, "UserName": user_name})
-        if not user:
-            logging.error(
-                f"User with ID {user_id} and username {user_name} not found.")
+        if not ObjectId.is_valid(user_id):
+            logger.error("Invalid user ID %s.", user_id)
             raise ValueError("Invalid user ID or username.")
+        user_id_obj = ObjectId(user_id)
 
         # Ensure account_balance is a float
         try:
             account_balance = float(account_balance)
         except ValueError:
-            logging.error("Account balance must be a valid number.")
+            logger.error("Account balance must be a valid number.")
             raise ValueError("Account balance must be a valid number.")
 
         # Validate account balance is greater than or equal to 0
         if account_balance < 0:
-            logging.error(
+            logger.error(
                 "Account balance must be greater than or equal to 0.")
             raise ValueError(
                 "Account balance must be greater than or equal to 0.")
@@ -124,117 +310,453 @@ class AccountsService:
         # Validate account balance does not exceed the limit
         initial_balance_limit = float(1000000)
         if account_balance > initial_balance_limit:
-            logging.error(
-                f"Account balance exceeds the limit of {initial_balance_limit}.")
+            logger.error(
+                "Account balance exceeds the limit of %s.", initial_balance_limit)
             raise ValueError(
                 f"Account balance exceeds the limit of {initial_balance_limit}.")
 
-        # Simple check for duplicate account number
-        if self.accounts_collection.find_one({"AccountNumber": account_number}):
-            logging.error(
-                f"Account with number {account_number} already exists.")
-            raise ValueError("An account with this number already exists.")
-
-        # Construct the account data with default values
-        account_data = {
-            "_id": ObjectId(),  # Generate a new unique ObjectId
-            "AccountNumber": account_number,
-            "AccountBank": "LeafyBank",
-            "AccountStatus": "Active",
-            "AccountIdentificationType": "AccountNumber",
-            "AccountDate": {
-                "OpeningDate": datetime.now(timezone.utc)
-            },
-            "AccountType": account_type,
-            "AccountBalance": account_balance,
-            "AccountCurrency": "USD",  # Default currency
-            "AccountDescription": f"{account_type} account for {user_name}",
-            "AccountUser": {
-                "UserName": user_name,
-                "UserId": user_id_obj
-            }
-        }
+        # Construct the account with default values and the next account number
+        now = datetime.now(timezone.utc)
+        account_number = self.account_number_allocator.allocate()
+        account = Account(
+            id=ObjectId(),  # Generate a new unique ObjectId
+            account_number=account_number,
+            account_bank="LeafyBank",
+            account_status="Active",
+            account_identification_type="AccountNumber",
+            account_date=AccountDate(opening_date=now),
+            account_type=account_type,
+            account_balance=account_balance,
+            account_currency="USD",  # Default currency
+            account_description=f"{account_type} account for {user_name}",
+            account_user=AccountUser(user_name=user_name, user_id=user_id_obj),
+            last_modified=now  # Equal to OpeningDate, marks a creation in the changes feed
+        )
+        account_doc = account.to_dict()
+
+        # Validate against the collection's $jsonSchema before any round trip
+        errors = self.account_validator.validate(account_doc)
+        if errors:
+            logger.error("Invalid account data: %s", errors)
+            raise ValueError("; ".join(errors))
+
+        # Check if the user exists in the users collection
+        user = self.users_collection.find_one(
+            {"_id": user_id_obj, "UserName": user_name}, {"_id": 1}, session=session)
+        if not user:
+            logger.error(
+                "User with ID %s and username %s not found.", user_id, user_name)
+            raise ValueError("Invalid user ID or username.")
 
         # Insert the account data into the accounts collection
-        result = self.accounts_collection.insert_one(account_data)
+        result = self.accounts_collection.insert_one(
+            account_doc, session=session)
         account_id = result.inserted_id
 
-        # Update the user's LinkedAccounts array in the users collection
+        # Update the user's LinkedAccounts array and AccountSummary in one operation
         self.users_collection.update_one(
             {"_id": user_id_obj},
-            {"$addToSet": {"LinkedAccounts": account_id}}
+            {
+                "$addToSet": {"LinkedAccounts": account_id},
+                "$inc": {
+                    "AccountSummary.ActiveAccounts": 1,
+                    f"AccountSummary.ByType.{account_type}.Active": 1,
+                    "AccountSummary.TotalBalance": account_balance
+                }
+            },
+            session=session
         )
 
-        return account_id
+        return account_id, account_number
+
+    def resolve_user_id(self, user_identifier: Union[str, ObjectId],
+                        session: Optional[ClientSession] = None) -> Optional[ObjectId]:
+        """Resolve a user identifier to its UserId, through a cache of UserName lookups.
+        Args:
+            user_identifier (Union[str, ObjectId]): The user identifier (username or ObjectId of the user).
+            session (Optional[ClientSession]): A causally consistent session for read-your-writes flows.
+        Returns:
+            Optional[ObjectId]: The UserId, or None if no user has this UserName.
+        """
+        if isinstance(user_identifier, ObjectId):
+            return user_identifier
+        user_id = self.user_id_cache.get(user_identifier)
+        if user_id is not None:
+            return user_id
+        user = self.users_collection.find_one(
+            {"UserName": user_identifier}, {"_id": 1}, session=session)
+        if not user:
+            # Not cached, so that a user created afterwards is found
+            logger.debug("No user found with username %s", user_identifier)
+            return None
+        self.user_id_cache.set(user_identifier, user["_id"])
+        return user["_id"]
 
-    def get_accounts_for_user(self, user_identifier: Union[str, ObjectId]) -> list[dict]:
+    def get_accounts_for_user(self, user_identifier: Union[str, ObjectId], session: Optional[ClientSession] = None) -> list[Account]:
         """Retrieve accounts for a specific user.
         Args:
             user_identifier (Union[str, ObjectId]): The user identifier (username or ObjectId of the user).
+            session (Optional[ClientSession]): A causally consistent session for read-your-writes flows.
 
         Returns:
-            list[dict]: A list of accounts associated with the user.
+            list[Account]: A list of accounts associated with the user.
         """
-        # Determine if the identifier is an ObjectId or a username
-        if isinstance(user_identifier, ObjectId):
-            query = {"AccountUser.UserId": user_identifier}
-        else:
-            query = {"AccountUser.UserName": user_identifier}
+        # Usernames are resolved to the UserId, so the query targets a single shard
+        user_id = self.resolve_user_id(user_identifier, session=session)
+        if user_id is None:
+            return []
+        query = {"AccountUser.UserId": user_id}
 
         # Retrieve the accounts matching the query
-        accounts = list(self.accounts_collection.find(query))
+        accounts = [Account.from_bson(doc)
+                    for doc in self.accounts_collection.find(query, session=session)]
         return accounts
 
-    def get_active_accounts_for_user(self, user_identifier: Union[str, ObjectId]) -> list[dict]:
+    def get_active_accounts_for_user(self, user_identifier: Union[str, ObjectId], session: Optional[ClientSession] = None) -> list[Account]:
         """Retrieve active accounts for a specific user.
         Args:
             user_identifier (Union[str, ObjectId]): The user identifier (username or ObjectId of the user).
+            session (Optional[ClientSession]): A causally consistent session for read-your-writes flows.
         Returns:
-            list[dict]: A list of active accounts associated with the user.
+            list[Account]: A list of active accounts associated with the user.
         """
-        # Determine if the identifier is an ObjectId or a username
+        # Usernames are resolved to the UserId, so the query targets a single shard
+        user_id = self.resolve_user_id(user_identifier, session=session)
+        if user_id is None:
+            return []
         # Query for Active accounts only
-        if isinstance(user_identifier, ObjectId):
-            query = {"AccountUser.UserId": user_identifier,
-                     "AccountStatus": "Active"}
-        else:
-            query = {"AccountUser.UserName": user_identifier,
-                     "AccountStatus": "Active"}
-        accounts = list(self.accounts_collection.find(query))
+        query = {"AccountUser.UserId": user_id, "AccountStatus": "Active"}
+        accounts = [Account.from_bson(doc)
+                    for doc in self.accounts_collection.find(query, session=session)]
         return accounts
 
-    def close_account(self, account_id: str) -> bool:
+    def close_account(self, account_id: str, session: Optional[ClientSession] = None) -> bool:
         """Attempt to close an account by its ID if the balance is zero.
         Args:
             account_id (str): The ID of the account to close.
+            session (Optional[ClientSession]): A causally consistent session for read-your-writes flows.
         Returns:
             bool: True if the account was successfully closed, False otherwise.
         """
         # Convert account_id to ObjectId
         account_oid = ObjectId(account_id)
-        # Find the account by its ObjectId
-        account = self.accounts_collection.find_one({"_id": account_oid})
+        # Find the account by its ObjectId, only the fields used below are needed
+        account = self.accounts_collection.find_one(
+            {"_id": account_oid},
+            {"AccountBalance": 1, "AccountType": 1, "AccountUser.UserId": 1},
+            session=session)
         if not account:
-            logging.error(f"Account with ID {account_id} not found.")
+            logger.error("Account with ID %s not found.", account_id)
             return False
         if account.get("AccountBalance", 0) != 0:
-            logging.error(
-                f"Account with ID {account_id} cannot be closed because it has a remaining balance.")
+            logger.error(
+                "Account with ID %s cannot be closed because it has a remaining balance.", account_id)
             return False
         # Update the account status to "Closed" and set the ClosingDate
+        now = datetime.now(timezone.utc)
+        closed_fields = {
+            "AccountStatus": "Closed",
+            "AccountDate.ClosingDate": now,
+            "LastModified": now
+        }
+        errors = self.account_validator.validate_fields(closed_fields)
+        if errors:
+            logger.error("Invalid account update: %s", errors)
+            raise ValueError("; ".join(errors))
+        # Matching on the Active status makes a repeated close a no-op
         result = self.accounts_collection.update_one(
-            {"_id": account_oid},
-            {
-                "$set": {
-                    "AccountStatus": "Closed",
-                    "AccountDate.ClosingDate": datetime.now(timezone.utc)
-                }
-            }
+            {"_id": account_oid, "AccountStatus": "Active"},
+            {"$set": closed_fields},
+            session=session
         )
         if result.modified_count > 0:
-            logging.info(f"Account with ID {account_id} successfully closed.")
+            # Move the account from the active to the closed counts of the user's AccountSummary
+            account_type = account["AccountType"]
+            self.users_collection.update_one(
+                {"_id": account["AccountUser"]["UserId"]},
+                {
+                    "$inc": {
+                        "AccountSummary.ActiveAccounts": -1,
+                        "AccountSummary.ClosedAccounts": 1,
+                        f"AccountSummary.ByType.{account_type}.Active": -1,
+                        f"AccountSummary.ByType.{account_type}.Closed": 1,
+                        "AccountSummary.TotalBalance": -account["AccountBalance"]
+                    }
+                },
+                session=session
+            )
+            logger.info("Account with ID %s successfully closed.", account_id)
             return True
         else:
-            logging.error(
-                f"Failed to close the account with ID {account_id} due to an unexpected error.")
+            logger.error(
+                "Failed to close the account with ID %s due to an unexpected error.", account_id)
+            return False
+
+    def get_account_changes(self, token: Optional[str] = None, limit: int = 500,
+                            settle_seconds: float = 5.0) -> tuple[list[dict], Optional[str], bool]:
+        """Retrieve the accounts created, closed or updated after a changes token.
+
+        Changes are ordered by (LastModified, _id), served from the
+        {LastModified: 1, _id: 1} index. Changes newer than settle_seconds are held
+        back, so that a token never moves past a write still in flight on another worker.
+
+        Args:
+            token (Optional[str]): The token returned by the previous call, None to start from the beginning.
+            limit (int): The maximum number of changes to return. Defaults to 500.
+            settle_seconds (float): How old a change must be before it is returned. Defaults to 5.
+
+        Returns:
+            tuple[list[dict], Optional[str], bool]: The changes ({"ChangeType", "Account"}),
+                the token to pass to the next call, and whether more changes are already available.
+
+        Raises:
+            ValueError: If the token is malformed.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settle_seconds)
+        query = {"LastModified": {"$lte": cutoff}}
+        if token:
+            last_modified, account_id = _decode_change_token(token)
+            query["$or"] = [
+                {"LastModified": {"$gt": last_modified}},
+                {"LastModified": last_modified, "_id": {"$gt": account_id}}
+            ]
+
+        docs = list(self.accounts_collection.find(query)
+                    .sort([("LastModified", ASCENDING), ("_id", ASCENDING)])
+                    .limit(limit + 1))
+        has_more = len(docs) > limit
+        changes = []
+        for doc in docs[:limit]:
+            account = Account.from_bson(doc)
+            if account.account_status == "Closed":
+                change_type = "closed"
+            elif account.last_modified == account.account_date.opening_date:
+                change_type = "created"
+            else:
+                change_type = "updated"
+            changes.append({"ChangeType": change_type, "Account": account})
+
+        if changes:
+            last = changes[-1]["Account"]
+            token = _encode_change_token(last.last_modified, last.id)
+        return changes, token, has_more
+
+    def backfill_last_modified(self) -> int:
+        """Set LastModified on accounts written before the field existed.
+
+        LastModified becomes the ClosingDate of closed accounts and the OpeningDate of the others.
+
+        Returns:
+            int: The number of accounts updated.
+        """
+        result = self.accounts_collection.update_many(
+            {"LastModified": {"$exists": False}},
+            [{"$set": {"LastModified": {"$ifNull": ["$AccountDate.ClosingDate", "$AccountDate.OpeningDate"]}}}]
+        )
+        logger.info("Backfilled LastModified on %s accounts", result.modified_count)
+        return result.modified_count
+
+    def archive_closed_accounts(self, closed_for_days: int = 90, batch_size: int = 500) -> int:
+        """Move accounts closed for longer than closed_for_days to the archive collection.
+
+        Each batch is copied with an unordered insert_many, then deleted from the accounts
+        collection. The job is resumable: if it stops between the two steps, the next run
+        copies the batch again, skipping the duplicate keys, and completes the delete.
+
+        Args:
+            closed_for_days (int): How long an account must have been closed. Defaults to 90.
+            batch_size (int): The number of accounts moved per batch. Defaults to 500.
+
+        Returns:
+            int: The number of accounts archived.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=closed_for_days)
+        query = {"AccountStatus": "Closed", "AccountDate.ClosingDate": {"$lt": cutoff}}
+        archived = 0
+        while True:
+            batch = list(self.accounts_collection.find(query)
+                         .sort("AccountDate.ClosingDate", ASCENDING)
+                         .limit(batch_size))
+            if not batch:
+                break
+            try:
+                self.archive_collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Accounts copied by an interrupted run are already in the archive
+                if any(error["code"] != DUPLICATE_KEY_ERROR for error in e.details["writeErrors"]):
+                    raise
+            result = self.accounts_collection.delete_many(
+                {"_id": {"$in": [doc["_id"] for doc in batch]}, "AccountStatus": "Closed"})
+            archived += result.deleted_count
+            logger.info("Archived %s closed accounts", archived)
+        return archived
+
+    def rebuild_account_summaries(self):
+        """Recompute the AccountSummary of every user from the accounts and archive collections.
+
+        Repairs summaries that drifted, e.g. after balances were changed by other services.
+        Runs as a single aggregation on the users collection that looks up each user's
+        accounts, and archived accounts (all closed), through the AccountUser.UserId
+        indexes and merges the result back into users.
+
+        Returns:
+            None
+        """
+        by_status = {
+            status: {"$sum": {"$cond": [{"$eq": ["$AccountStatus", status]}, 1, 0]}}
+            for status in ("Active", "Closed")
+        }
+        self.users_collection.aggregate([
+            {"$project": {"_id": 1}},
+            {"$lookup": {
+                "from": self.accounts_collection.name,
+                "localField": "_id",
+                "foreignField": "AccountUser.UserId",
+                "pipeline": [
+                    {"$group": {
+                        "_id": "$AccountType",
+                        **by_status,
+                        "ActiveBalance": {"$sum": {"$cond": [
+                            {"$eq": ["$AccountStatus", "Active"]}, "$AccountBalance", 0]}}
+                    }}
+                ],
+                "as": "ByType"
+            }},
+            {"$lookup": {
+                "from": self.archive_collection.name,
+                "localField": "_id",
+                "foreignField": "AccountUser.UserId",
+                "pipeline": [
+                    {"$group": {"_id": "$AccountType", "Closed": {"$sum": 1}}}
+                ],
+                "as": "ArchivedByType"
+            }},
+            {"$project": {"AccountSummary": {
+                "ActiveAccounts": {"$sum": "$ByType.Active"},
+                "ClosedAccounts": {"$add": [{"$sum": "$ByType.Closed"}, {"$sum": "$ArchivedByType.Closed"}]},
+                "TotalBalance": {"$sum": "$ByType.ActiveBalance"},
+                "ByType": {"$arrayToObject": {"$map": {
+                    "input": {"$setUnion": ["$ByType._id", "$ArchivedByType._id"]},
+                    "as": "type",
+                    "in": {"k": "$$type", "v": {
+                        "Active": _sum_for_type("$ByType", "Active"),
+                        "Closed": {"$add": [_sum_for_type("$ByType", "Closed"),
+                                            _sum_for_type("$ArchivedByType", "Closed")]}
+                    }}
+                }}}
+            }}},
+            {"$merge": {
+                "into": self.users_collection.name,
+                "on": "_id",
+                "whenMatched": "merge",
+                "whenNotMatched": "discard"
+            }}
+        ])
+        logger.info("Rebuilt account summaries")
+
+    def ensure_indexes(self):
+        """Create the indexes the account queries rely on. Existing indexes are left untouched."""
+        # Changes feed: keyset pagination on (LastModified, _id)
+        self.accounts_collection.create_index(
+            [("LastModified", ASCENDING), ("_id", ASCENDING)], name="LastModified_id")
+        # Per-user account queries and the AccountSummary rebuild lookup, which counts
+        # closed accounts too, so this one stays a full index
+        self.accounts_collection.create_index(
+            [("AccountUser.UserId", ASCENDING)], name="AccountUser_UserId")
+        # Account numbers are unique; the index also serves the by-number lookups.
+        # It replaces the partial AccountNumber_active index of earlier versions
+        self.ensure_account_number_index()
+        # Range queries: balance ranges within a status, optionally a type, in keyset order.
+        # The trailing OpeningDate key filters opening date ranges before any fetch
+        self.accounts_collection.create_index(
+            [("AccountStatus", ASCENDING), ("AccountBalance", ASCENDING), ("_id", ASCENDING),
+             ("AccountDate.OpeningDate", ASCENDING)],
+            name="AccountStatus_AccountBalance_id_OpeningDate")
+        self.accounts_collection.create_index(
+            [("AccountStatus", ASCENDING), ("AccountType", ASCENDING),
+             ("AccountBalance", ASCENDING), ("_id", ASCENDING), ("AccountDate.OpeningDate", ASCENDING)],
+            name="AccountStatus_AccountType_AccountBalance_id_OpeningDate")
+        # ... and over any status. The AccountStatus-prefixed indexes above also serve
+        # the active-path queries
+        self.accounts_collection.create_index(
+            [("AccountBalance", ASCENDING), ("_id", ASCENDING), ("AccountDate.OpeningDate", ASCENDING)],
+            name="AccountBalance_id_OpeningDate")
+        # Replaced by the indexes above
+        existing_indexes = self.accounts_collection.index_information()
+        for index_name in ("AccountStatus_active", "AccountStatus_AccountBalance_id",
+                           "AccountStatus_AccountType_AccountBalance_id", "AccountBalance_id"):
+            if index_name in existing_indexes:
+                self.accounts_collection.drop_index(index_name)
+        # Archival job: closed accounts by ClosingDate
+        self.accounts_collection.create_index(
+            [("AccountDate.ClosingDate", ASCENDING)], name="AccountDate_ClosingDate_closed",
+            partialFilterExpression={"AccountStatus": "Closed"})
+        # Archive: the AccountSummary rebuild lookup. Account numbers are allocated by
+        # the service, so the archive no longer needs an AccountNumber index
+        self.archive_collection.create_index(
+            [("AccountUser.UserId", ASCENDING)], name="AccountUser_UserId")
+        if "AccountNumber" in self.archive_collection.index_information():
+            self.archive_collection.drop_index("AccountNumber")
+        self.seed_account_numbers()
+
+    def ensure_account_number_index(self):
+        """Create the unique AccountNumber index, unless existing accounts share a number.
+
+        Account numbers were chosen by clients before the service allocated them, so
+        older data may hold duplicates, on which the unique index build would fail and
+        stop the service from starting. Duplicates are looked for only while the index
+        does not exist yet; if any are found, they are logged and the index is skipped
+        until they are resolved.
+
+        Returns:
+            bool: Whether the unique index exists.
+        """
+        indexes = self.accounts_collection.index_information()
+        if indexes.get("AccountNumber", {}).get("unique"):
+            return True
+        duplicates = self.find_duplicate_account_numbers()
+        if duplicates:
+            logger.error(
+                "Not creating the unique AccountNumber index: %d account numbers are used by "
+                "more than one account, e.g. %s. Renumber these accounts and restart the service",
+                len(duplicates), ", ".join(str(number) for number in duplicates[:10]))
             return False
+        if "AccountNumber_active" in indexes:
+            self.accounts_collection.drop_index("AccountNumber_active")
+        self.accounts_collection.create_index(
+            [("AccountNumber", ASCENDING)], name="AccountNumber", unique=True)
+        return True
+
+    def find_duplicate_account_numbers(self) -> list:
+        """Find the account numbers used by more than one account.
+
+        Returns:
+            list: The duplicated account numbers, in ascending order.
+        """
+        return [doc["_id"] for doc in self.accounts_collection.aggregate([
+            {"$group": {"_id": "$AccountNumber", "Count": {"$sum": 1}}},
+            {"$match": {"Count": {"$gt": 1}}},
+            {"$sort": {"_id": 1}}
+        ], allowDiskUse=True)]
+
+    def seed_account_numbers(self):
+        """Start the account number counter above the highest account number in use.
+
+        Account numbers were chosen by clients before the service allocated them, so on
+        first use the counter is moved past the highest numeric AccountNumber of the
+        accounts and archived accounts. Once the counter exists, nothing is scanned.
+
+        Returns:
+            None
+        """
+        if self.account_number_allocator.is_seeded():
+            return
+        highest = 0
+        for collection in (self.accounts_collection, self.archive_collection):
+            for doc in collection.aggregate([
+                {"$match": {"AccountNumber": {"$regex": r"^[0-9]+$"}}},
+                {"$group": {"_id": None, "Highest": {"$max": {"$toLong": "$AccountNumber"}}}}
+            ]):
+                highest = max(highest, doc["Highest"] or 0)
+        self.account_number_allocator.seed(highest)
+        logger.info("Account numbers are allocated above %s", highest)
@@ -0,0 +1,152 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from bson import Binary
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from database.connection import MongoDBConnection
+from utils.lru_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyService:
+    """This class records the responses of requests sent with an Idempotency-Key.
+
+    Records live in a collection with a TTL index on CreatedAt, fronted by an in-process
+    LRU cache of completed responses. A key is first claimed with a "pending" record,
+    whose unique _id makes sure only one execution runs across all workers, then
+    completed with the response to replay to retries.
+
+    A pending claim holds a lease (PendingUntil): if its worker crashes or restarts
+    before completing or releasing it, a later request takes the key over once the
+    lease expired, instead of waiting for the TTL.
+    """
+
+    def __init__(self, connection: MongoDBConnection, db_name: str, idempotency_collection_name: str,
+                 ttl_seconds: int = 86400, cache_size: int = 10000, lease_seconds: float = 30.0):
+        """Initialize the IdempotencyService.
+
+        Args:
+            connection (MongoDBConnection): The MongoDB connection instance.
+            db_name (str): The name of the database.
+            idempotency_collection_name (str): The name of the idempotency keys collection.
+            ttl_seconds (int): How long a key is remembered. Defaults to 24 hours.
+            cache_size (int): The number of completed responses cached in-process. Defaults to 10000.
+            lease_seconds (float): How long a pending claim is honoured; keep it above the request deadline. Defaults to 30.
+
+        Returns:
+            None
+        """
+        self.idempotency_collection = connection.get_collection(
+            db_name, idempotency_collection_name)
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.cache = TTLCache(cache_size, ttl_seconds)
+
+    def ensure_indexes(self):
+        """Create the TTL index that expires old keys."""
+        self.idempotency_collection.create_index(
+            [("CreatedAt", ASCENDING)], name="CreatedAt_ttl", expireAfterSeconds=self.ttl_seconds)
+
+    def get_cached(self, key: str) -> Optional[dict]:
+        """Retrieve the completed record of a key from the in-process cache only, without a round trip.
+
+        Args:
+            key (str): The scoped idempotency key.
+
+        Returns:
+            Optional[dict]: The completed record, or None if it is not cached.
+        """
+        return self.cache.get(key)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Retrieve the record of a key, from the cache when completed.
+
+        Args:
+            key (str): The scoped idempotency key.
+
+        Returns:
+            Optional[dict]: The record (Status "pending" or "completed"), or None if the key is unknown.
+        """
+        record = self.cache.get(key)
+        if record is not None:
+            return record
+        record = self.idempotency_collection.find_one({"_id": key})
+        if record is not None and record["Status"] == "completed":
+            self.cache.set(key, record)
+        return record
+
+    def claim(self, key: str, fingerprint: str) -> Optional[dict]:
+        """Claim a key before executing its request.
+
+        Args:
+            key (str): The scoped idempotency key.
+            fingerprint (str): A hash of the request body, to detect keys reused for another request.
+
+        Returns:
+            Optional[dict]: None if the key was claimed, or taken over from an expired
+                pending claim, otherwise the existing record.
+        """
+        now = datetime.now(timezone.utc)
+        claim = {
+            "Status": "pending",
+            "Fingerprint": fingerprint,
+            "CreatedAt": now,
+            "PendingUntil": now + timedelta(seconds=self.lease_seconds)
+        }
+        try:
+            self.idempotency_collection.insert_one({"_id": key, **claim})
+            return None
+        except DuplicateKeyError:
+            pass
+        # A pending claim whose lease expired was abandoned by its worker; claims
+        # written before leases existed expire lease_seconds after their creation
+        taken_over = self.idempotency_collection.find_one_and_update(
+            {"_id": key, "Status": "pending", "$or": [
+                {"PendingUntil": {"$lt": now}},
+                {"PendingUntil": {"$exists": False},
+                 "CreatedAt": {"$lt": now - timedelta(seconds=self.lease_seconds)}}
+            ]},
+            {"$set": claim})
+        if taken_over is not None:
+            logger.warning("Took over the expired claim of idempotency key %s", key)
+            return None
+        return self.get(key)
+
+    def complete(self, key: str, status_code: int, headers: list[list[str]], body: bytes):
+        """Store the response of a claimed key.
+
+        Args:
+            key (str): The scoped idempotency key.
+            status_code (int): The response status code.
+            headers (list[list[str]]): The response headers to replay, as [name, value] pairs.
+            body (bytes): The response body.
+
+        Returns:
+            None
+        """
+        response = {
+            "Status": "completed",
+            "ResponseStatus": status_code,
+            "ResponseHeaders": headers,
+            "ResponseBody": Binary(body)
+        }
+        record = self.idempotency_collection.find_one_and_update(
+            {"_id": key}, {"$set": response, "$unset": {"PendingUntil": ""}}, return_document=True)
+        if record is not None:
+            self.cache.set(key, record)
+
+    def release(self, key: str):
+        """Forget a claimed key whose request failed, so that a retry executes again.
+
+        Args:
+            key (str): The scoped idempotency key.
+
+        Returns:
+            None
+        """
+        self.cache.pop(key)
+        self.idempotency_collection.delete_one({"_id": key, "Status": "pending"})
@@ -1,59 +1,271 @@
+import base64
+import json
+import re
+
 from bson import ObjectId
-from typing import Union
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import ASCENDING
+from typing import Optional, Union
 from database.connection import MongoDBConnection
+from models.user import AccountSummary, User
 
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+# Fields returned by the user search
+SEARCH_PROJECTION = {"UserName": 1, "UserEmail": 1, "Name": 1}
+
+# Fields normalized into SearchKeys, matched by prefix
+SEARCH_FIELDS = ("$UserName", "$UserEmail", "$Name.FirstName", "$Name.LastName")
+
+
+def _encode_search_token(search_key: str, user_id: ObjectId) -> str:
+    """Encode the position after a user in the (SearchKeys, _id) order as an opaque token."""
+    position = {"k": search_key, "id": str(user_id)}
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def _decode_search_token(token: str) -> tuple[str, ObjectId]:
+    """Decode a search token into its (SearchKeys, _id) position.
+
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return str(position["k"]), ObjectId(position["id"])
+    except Exception as e:
+        raise ValueError("Invalid search token.") from e
+
+
+def _user_query(user_identifier: Union[str, ObjectId]) -> dict:
+    """Build the filter matching a user by ObjectId or UserName."""
+    if isinstance(user_identifier, ObjectId):
+        return {"_id": user_identifier}
+    return {"UserName": user_identifier}
 
 
 class UsersService:
     """This class provides methods to interact with users in the database."""
 
-    def __init__(self, connection: MongoDBConnection, db_name: str, users_collection_name: str):
+    def __init__(self, connection: MongoDBConnection, db_name: str, users_collection_name: str,
+                 bulk_read_preference=None, lean_array_limit: int = 10):
         """Initialize the UserService with the MongoDB connection and collection name.
 
         Args:
             connection (MongoDBConnection): The MongoDB connection instance.
             db_name (str): The name of the database.
             users_collection_name (str): The name of the users collection.
+            bulk_read_preference (Optional[_ServerMode]): The read preference for bulk lists. Defaults to primary.
+            lean_array_limit (int): How many RecentTransactions and LinkedAccounts lean reads return. Defaults to 10.
 
         Returns:
             None
         """
         self.users_collection = connection.get_collection(
             db_name, users_collection_name)
+        # Same collection, routed with the bulk read preference
+        self.bulk_users_collection = connection.get_collection(
+            db_name, users_collection_name, read_preference=bulk_read_preference)
+        # Same collection, returning undecoded RawBSONDocument for passthrough reads
+        self.raw_users_collection = connection.get_collection(
+            db_name, users_collection_name,
+            codec_options=CodecOptions(document_class=RawBSONDocument))
+        # User reads leave out the internal SearchKeys maintained by backfill_search_keys
+        self.full_projection = {"SearchKeys": 0}
+        # Lean reads also keep only the latest transactions and the first linked accounts,
+        # so that user documents stay constant-size however active the customer is. A
+        # projection of $slice and exclusions keeps every other field of the document
+        self.lean_projection = {
+            **self.full_projection,
+            "RecentTransactions": {"$slice": -lean_array_limit},
+            "LinkedAccounts": {"$slice": lean_array_limit}
+        }
 
-    def get_users(self) -> list[dict]:
+    def get_users(self, lean: bool = True) -> list[User]:
         """Retrieve all users from the users collection.
 
+        Args:
+            lean (bool): Bound RecentTransactions and LinkedAccounts to the lean array limit. Defaults to True.
+
         Returns:
-            list[dict]: A list of all users in the collection.
+            list[User]: A list of all users in the collection.
         """
         # Retrieve all users from the collection
-        logging.info(f"Retrieving all users from the collection...")
-        users = list(self.users_collection.find())
+        logger.debug("Retrieving all users from the collection...")
+        projection = self.lean_projection if lean else self.full_projection
+        users = [User.from_bson(doc)
+                 for doc in self.bulk_users_collection.find({}, projection)]
         return users
 
-    def get_user(self, user_identifier: Union[str, ObjectId]) -> dict:
+    def get_user(self, user_identifier: Union[str, ObjectId], raw: bool = False,
+                 lean: bool = True) -> Union[User, RawBSONDocument]:
         """Retrieve a specific user by UserName or ObjectId.
         Args:
             user_identifier (Union[str, ObjectId]): The user identifier (username or ObjectId of the user).
+            raw (bool): Return an undecoded RawBSONDocument instead of a User model. Defaults to False.
+            lean (bool): Bound RecentTransactions and LinkedAccounts to the lean array limit. Defaults to True.
         Returns:
-            dict: The user document if found, otherwise None.
+            Union[User, RawBSONDocument]: The user if found, otherwise None.
         """
-        # Determine if the identifier is an ObjectId or a username
-        if isinstance(user_identifier, ObjectId):
-            query = {"_id": user_identifier}
-        else:
-            query = {"UserName": user_identifier}
+        query = _user_query(user_identifier)
+        projection = self.lean_projection if lean else self.full_projection
         # Retrieve the user matching the query
-        user = self.users_collection.find_one(query)
+        collection = self.raw_users_collection if raw else self.users_collection
+        user = collection.find_one(query, projection)
         if user:
-            logging.info(f"Returning user with ObjectId {user['_id']}")
-            return user
+            # Log the identifier rather than user['_id'], which would inflate a raw document
+            logger.debug("Returning user with identifier %s", user_identifier)
+            return user if raw else User.from_bson(user)
         else:
-            logging.error("No user found with the given identifier.")
+            logger.debug("No user found with identifier %s", user_identifier)
+            return None
+
+    def get_account_summary(self, user_identifier: Union[str, ObjectId]) -> Optional[AccountSummary]:
+        """Retrieve the AccountSummary of a user by UserName or ObjectId.
+        Args:
+            user_identifier (Union[str, ObjectId]): The user identifier (username or ObjectId of the user).
+        Returns:
+            Optional[AccountSummary]: The user's summary (zero counts if none was recorded yet), or None if the user does not exist.
+        """
+        user = self.users_collection.find_one(
+            _user_query(user_identifier), {"AccountSummary": 1})
+        if not user:
+            logger.debug("No user found with identifier %s", user_identifier)
             return None
+        return AccountSummary.from_bson(user.get("AccountSummary", {}))
+
+    def get_recent_transactions(self, user_identifier: Union[str, ObjectId], skip: int = 0,
+                                limit: int = 20) -> Optional[tuple[list[dict], int]]:
+        """Retrieve a page of a user's RecentTransactions, newest first.
+        Args:
+            user_identifier (Union[str, ObjectId]): The user identifier (username or ObjectId of the user).
+            skip (int): The number of transactions to skip. Defaults to 0.
+            limit (int): The maximum number of transactions to return. Defaults to 20.
+        Returns:
+            Optional[tuple[list[dict], int]]: The page of transactions and their total count, or None if the user does not exist.
+        """
+        return self._get_array_page(user_identifier, "RecentTransactions", skip, limit, newest_first=True)
+
+    def get_linked_accounts(self, user_identifier: Union[str, ObjectId], skip: int = 0,
+                            limit: int = 20) -> Optional[tuple[list[ObjectId], int]]:
+        """Retrieve a page of a user's LinkedAccounts, in linking order.
+        Args:
+            user_identifier (Union[str, ObjectId]): The user identifier (username or ObjectId of the user).
+            skip (int): The number of account IDs to skip. Defaults to 0.
+            limit (int): The maximum number of account IDs to return. Defaults to 20.
+        Returns:
+            Optional[tuple[list[ObjectId], int]]: The page of account IDs and their total count, or None if the user does not exist.
+        """
+        return self._get_array_page(user_identifier, "LinkedAccounts", skip, limit, newest_first=False)
+
+    def _get_array_page(self, user_identifier: Union[str, ObjectId], field_name: str, skip: int,
+                        limit: int, newest_first: bool) -> Optional[tuple[list, int]]:
+        """Slice an array field of a user on the server, returning only the requested page.
+        Args:
+            user_identifier (Union[str, ObjectId]): The user identifier (username or ObjectId of the user).
+            field_name (str): The array field, RecentTransactions or LinkedAccounts.
+            skip (int): The number of elements to skip.
+            limit (int): The maximum number of elements to return.
+            newest_first (bool): Page from the end of the array, where new elements are appended.
+        Returns:
+            Optional[tuple[list, int]]: The page and the array size, or None if the user does not exist.
+        """
+        items = {"$ifNull": [f"${field_name}", []]}
+        if newest_first:
+            items = {"$reverseArray": items}
+        pipeline = [
+            {"$match": _user_query(user_identifier)},
+            {"$project": {
+                "_id": 0,
+                "Items": {"$slice": [items, skip, limit]},
+                "Total": {"$size": {"$ifNull": [f"${field_name}", []]}}
+            }}
+        ]
+        page = next(self.users_collection.aggregate(pipeline), None)
+        if page is None:
+            logger.debug("No user found with identifier %s", user_identifier)
+            return None
+        return page["Items"], page["Total"]
+
+    def search_users(self, text: str, limit: int = 20,
+                     token: Optional[str] = None) -> tuple[list[dict], Optional[str]]:
+        """Find users whose UserName, UserEmail, first or last name starts with a text, ignoring case.
+
+        Matches an anchored prefix against the lowercase SearchKeys array, walking the
+        {SearchKeys, _id} index without a sort: each user comes once, at its lowest
+        matching key, so results are ordered by (key, _id) and pages are chained with
+        that position. Only users whose SearchKeys were set by backfill_search_keys are found.
+
+        Args:
+            text (str): The prefix to search for.
+            limit (int): The maximum number of users to return. Defaults to 20.
+            token (Optional[str]): The token returned by the previous call, None for the first page.
+
+        Returns:
+            tuple[list[dict], Optional[str]]: The matching users (_id, UserName, UserEmail and Name)
+                and the token of the next page, None on the last page.
+
+        Raises:
+            ValueError: If the text is blank or the token is malformed.
+        """
+        prefix = text.strip().lower()
+        if not prefix:
+            raise ValueError("The search text is empty.")
+        key_match = {"$regex": f"^{re.escape(prefix)}"}
+        after = None
+        if token:
+            after = _decode_search_token(token)
+            key_match["$gte"] = after[0]
+
+        users = []
+        last_key = None
+        next_token = None
+        # $elemMatch makes the prefix and the position bound the same index key
+        with (self.users_collection.find({"SearchKeys": {"$elemMatch": key_match}},
+                                         {**SEARCH_PROJECTION, "SearchKeys": 1})
+              .hint("SearchKeys_id")
+              .batch_size(limit + 1)) as cursor:
+            for user in cursor:
+                search_key = min(key for key in user.pop("SearchKeys") if key.startswith(prefix))
+                if after is not None and (search_key, user["_id"]) <= after:
+                    # Listed on an earlier page, under a lower key
+                    continue
+                if len(users) == limit:
+                    last = users[-1]
+                    next_token = _encode_search_token(last_key, last["_id"])
+                    break
+                users.append(user)
+                last_key = search_key
+        logger.debug("Found %s users matching %s", len(users), text)
+        return users, next_token
+
+    def backfill_search_keys(self) -> int:
+        """Set the lowercase SearchKeys of every user from its UserName, UserEmail and names.
+
+        Users are written outside this service, so run it after users are added or renamed.
+
+        Returns:
+            int: The number of users updated.
+        """
+        result = self.users_collection.update_many(
+            {},
+            # $setDifference dedupes the keys and drops those of missing fields
+            [{"$set": {"SearchKeys": {"$setDifference": [[
+                {"$toLower": {"$ifNull": [field_path, ""]}} for field_path in SEARCH_FIELDS
+            ], [""]]}}}]
+        )
+        logger.info("Backfilled SearchKeys on %s users", result.modified_count)
+        return result.modified_count
+
+    def ensure_indexes(self):
+        """Create the indexes the user queries rely on. Existing indexes are left untouched."""
+        # User search: anchored prefix regex on the normalized keys, in keyset order.
+        # It replaces the SearchKeys index of earlier versions
+        self.users_collection.create_index(
+            [("SearchKeys", ASCENDING), ("_id", ASCENDING)], name="SearchKeys_id")
+        if "SearchKeys" in self.users_collection.index_information():
+            self.users_collection.drop_index("SearchKeys")
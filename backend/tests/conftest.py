@@ -0,0 +1,135 @@
+from collections import namedtuple
+from typing import Optional
+
+import pytest
+from bson import ObjectId
+from pymongo import ReadPreference
+from pymongo.results import InsertOneResult
+
+from database.connection import MongoDBConnection
+from services.accounts_service import AccountsService
+
+# One operation received by a FakeCollection
+Call = namedtuple("Call", "collection operation filter session read_preference")
+
+
+def _get_path(doc: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None
+        doc = doc[part]
+    return doc
+
+
+def _set_path(doc: dict, path: str, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    for path, expected in query.items():
+        if isinstance(expected, dict) or path.startswith("$"):
+            raise NotImplementedError(f"FakeCollection only matches equality filters, got {path}")
+        if _get_path(doc, path) != expected:
+            return False
+    return True
+
+
+class FakeCollection:
+    """In-memory stand-in for a pymongo Collection, recording every operation it receives.
+
+    Collections of the same name share their documents and call log, like the primary
+    and bulk (secondary-routed) variants of one MongoDB collection.
+    """
+
+    def __init__(self, name: str, docs: list, calls: list, read_preference=None):
+        self.name = name
+        self.docs = docs
+        self.calls = calls
+        self.read_preference = read_preference
+
+    def _record(self, operation: str, query: dict, session):
+        self.calls.append(Call(self.name, operation, query, session, self.read_preference))
+
+    def find(self, query: Optional[dict] = None, projection=None, session=None, **kwargs) -> list:
+        self._record("find", query or {}, session)
+        return [dict(doc) for doc in self.docs if _matches(doc, query or {})]
+
+    def find_one(self, query: Optional[dict] = None, projection=None, session=None, **kwargs) -> Optional[dict]:
+        self._record("find_one", query or {}, session)
+        return next((dict(doc) for doc in self.docs if _matches(doc, query or {})), None)
+
+    def insert_one(self, document: dict, session=None) -> InsertOneResult:
+        self._record("insert_one", {"_id": document.get("_id")}, session)
+        document.setdefault("_id", ObjectId())
+        self.docs.append(dict(document))
+        return InsertOneResult(document["_id"], True)
+
+    def update_one(self, query: dict, update: dict, upsert: bool = False, session=None):
+        self._record("update_one", query, session)
+        self._update(query, update, upsert)
+
+    def find_one_and_update(self, query: dict, update: dict, upsert: bool = False,
+                            return_document=False, session=None, **kwargs) -> Optional[dict]:
+        self._record("find_one_and_update", query, session)
+        return dict(self._update(query, update, upsert) or {}) or None
+
+    def _update(self, query: dict, update: dict, upsert: bool) -> Optional[dict]:
+        doc = next((doc for doc in self.docs if _matches(doc, query)), None)
+        if doc is None:
+            if not upsert:
+                return None
+            doc = dict(query)
+            self.docs.append(doc)
+        for operator, fields in update.items():
+            for path, value in fields.items():
+                current = _get_path(doc, path)
+                if operator == "$set":
+                    _set_path(doc, path, value)
+                elif operator == "$inc":
+                    _set_path(doc, path, (current or 0) + value)
+                elif operator == "$max":
+                    _set_path(doc, path, value if current is None else max(current, value))
+                elif operator == "$addToSet":
+                    _set_path(doc, path, (current or []) + ([] if value in (current or []) else [value]))
+                else:
+                    raise NotImplementedError(f"FakeCollection does not support {operator}")
+        return doc
+
+
+class FakeConnection(MongoDBConnection):
+    """MongoDBConnection whose collections are FakeCollections.
+
+    The client is real but never used for I/O, so sessions are real ClientSessions.
+    """
+
+    def __init__(self):
+        super().__init__("mongodb://localhost:27017/?serverSelectionTimeoutMS=100")
+        self.docs = {}
+        self.calls = []
+
+    def get_collection(self, db_name: str, collection_name: str, codec_options=None, read_preference=None):
+        return FakeCollection(collection_name, self.docs.setdefault(collection_name, []),
+                              self.calls, read_preference)
+
+
+@pytest.fixture
+def connection():
+    connection = FakeConnection()
+    yield connection
+    connection.client.close()
+
+
+@pytest.fixture
+def accounts_service(connection):
+    return AccountsService(connection, "leafy_bank", "accounts", "users",
+                           bulk_read_preference=ReadPreference.SECONDARY_PREFERRED)
+
+
+@pytest.fixture
+def user(connection):
+    user = {"_id": ObjectId(), "UserName": "ada", "LinkedAccounts": []}
+    connection.docs.setdefault("users", []).append(user)
+    return user
@@ -0,0 +1,63 @@
+from bson import ObjectId
+
+from services.account_events_service import AccountEventsService
+
+
+class _Stream:
+    """Change stream yielding the given changes, then stopping the service."""
+
+    def __init__(self, service, changes):
+        self.service = service
+        self.changes = list(changes)
+        self.resume_token = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def try_next(self):
+        if not self.changes:
+            self.service._stop.set()
+            return None
+        return self.changes.pop(0)
+
+
+class _Loop:
+    def __init__(self):
+        self.callbacks = []
+
+    def call_soon_threadsafe(self, callback, *args):
+        self.callbacks.append((callback, args))
+
+
+def _account(**fields) -> dict:
+    return {
+        "_id": ObjectId(),
+        "AccountNumber": "000000001",
+        "AccountBank": "LeafyBank",
+        "AccountStatus": "Active",
+        "AccountIdentificationType": "AccountNumber",
+        "AccountDate": {"OpeningDate": None},
+        "AccountType": "Checking",
+        "AccountBalance": 0.0,
+        "AccountCurrency": "USD",
+        "AccountDescription": "Checking account for ada",
+        "AccountUser": {"UserName": "ada", "UserId": ObjectId()},
+        **fields,
+    }
+
+
+def test_watcher_skips_undecodable_changes(connection):
+    service = AccountEventsService(connection, "leafy_bank", "accounts")
+    malformed = _account()
+    del malformed["AccountBank"]
+    changes = [{"operationType": "insert", "fullDocument": malformed},
+               {"operationType": "insert", "fullDocument": _account()}]
+    service.accounts_collection.watch = lambda *args, **kwargs: _Stream(service, changes)
+    service._loop = _Loop()
+
+    service._watch()
+
+    assert len(service._loop.callbacks) == 1
@@ -0,0 +1,56 @@
+from bson import ObjectId
+
+
+def _finds(connection, collection: str) -> list:
+    return [call for call in connection.calls
+            if call.collection == collection and call.operation in ("find", "find_one")]
+
+
+def test_resolve_user_id_returns_cached_id_without_query(connection, accounts_service):
+    user_id = ObjectId()
+    accounts_service.user_id_cache.set("ada", user_id)
+
+    assert accounts_service.resolve_user_id("ada") == user_id
+    assert _finds(connection, "users") == []
+
+
+def test_resolve_user_id_looks_up_and_caches_username(connection, accounts_service, user):
+    assert accounts_service.resolve_user_id("ada") == user["_id"]
+    assert accounts_service.resolve_user_id("ada") == user["_id"]
+
+    assert [call.filter for call in _finds(connection, "users")] == [{"UserName": "ada"}]
+
+
+def test_resolve_user_id_does_not_cache_unknown_username(connection, accounts_service):
+    assert accounts_service.resolve_user_id("grace") is None
+
+    # A user created afterwards is found
+    user_id = ObjectId()
+    connection.docs["users"].append({"_id": user_id, "UserName": "grace"})
+    assert accounts_service.resolve_user_id("grace") == user_id
+    assert len(_finds(connection, "users")) == 2
+
+
+def test_resolve_user_id_passes_object_id_through(connection, accounts_service):
+    user_id = ObjectId()
+
+    assert accounts_service.resolve_user_id(user_id) == user_id
+    assert _finds(connection, "users") == []
+
+
+def test_per_user_queries_always_filter_on_user_id(connection, accounts_service, user):
+    for user_identifier in ("ada", user["_id"]):
+        accounts_service.get_accounts_for_user(user_identifier)
+        accounts_service.get_active_accounts_for_user(user_identifier)
+
+    account_filters = [call.filter for call in _finds(connection, "accounts")]
+    assert len(account_filters) == 4
+    assert all(query["AccountUser.UserId"] == user["_id"] for query in account_filters)
+    assert all("AccountUser.UserName" not in query for query in account_filters)
+
+
+def test_per_user_queries_skip_unknown_username(connection, accounts_service):
+    assert accounts_service.get_accounts_for_user("grace") == []
+    assert accounts_service.get_active_accounts_for_user("grace") == []
+
+    assert _finds(connection, "accounts") == []
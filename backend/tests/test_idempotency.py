@@ -0,0 +1,47 @@
+import asyncio
+import hashlib
+
+from bson import Binary
+
+from middleware.idempotency import IdempotencyMiddleware
+from services.idempotency_service import IdempotencyService
+
+
+def _call(middleware, body: bytes, key: str) -> list:
+    scope = {"type": "http", "path": "/create-account",
+             "headers": [(b"idempotency-key", key.encode())]}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return messages
+
+
+def test_cached_replay_issues_no_mongo_operations(connection):
+    idempotency_service = IdempotencyService(connection, "leafy_bank", "idempotency_keys")
+    body = b'{"UserName": "ada"}'
+    idempotency_service.cache.set("/create-account:k1", {
+        "_id": "/create-account:k1",
+        "Status": "completed",
+        "Fingerprint": hashlib.sha256(body).hexdigest(),
+        "ResponseStatus": 200,
+        "ResponseHeaders": [["content-type", "application/json"]],
+        "ResponseBody": Binary(b'{"account_id": "1"}'),
+    })
+
+    async def app(scope, receive, send):
+        raise AssertionError("a replayed request must not run")
+
+    middleware = IdempotencyMiddleware(app, idempotency_service=idempotency_service,
+                                       routes={"/create-account"})
+    start, body_message = _call(middleware, body, "k1")
+
+    assert start["status"] == 200
+    assert (b"idempotent-replayed", b"true") in start["headers"]
+    assert body_message["body"] == b'{"account_id": "1"}'
+    assert connection.calls == []
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from models.user import User
+
+
+def _user_doc(**fields) -> dict:
+    return {
+        "_id": ObjectId(),
+        "UserName": "ada",
+        "UserEmail": "ada@example.com",
+        "UserIdentification": "X1",
+        "Name": {"FirstName": "Ada", "LastName": "Lovelace", "NamePrefix": "Miss"},
+        "ResidentialStatus": "Resident",
+        "CivilStatus": "Single",
+        "BirthDate": datetime(1815, 12, 10),
+        "Nationality": "British",
+        "JobTitle": "Mathematician",
+        "UserAddress": {"StreetAndNumber": "1", "PostalCode": "2", "City": "London",
+                        "Country": "UK", "State": "England"},
+        "LinkedAccounts": [],
+        "RecentTransactions": [],
+        **fields,
+    }
+
+
+def test_user_round_trip_keeps_unmodeled_fields():
+    doc = _user_doc(PhoneNumber="555-0100", SearchKeys=["ada", "lovelace"])
+
+    user = User.from_bson(doc)
+
+    assert user.extra == {"PhoneNumber": "555-0100", "SearchKeys": ["ada", "lovelace"]}
+    assert user.to_dict() == doc
+
+
+def test_user_without_unmodeled_fields_has_empty_extra():
+    doc = _user_doc()
+
+    assert User.from_bson(doc).extra == {}
+    assert User.from_bson(doc).to_dict() == doc
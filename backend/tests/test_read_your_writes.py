@@ -0,0 +1,25 @@
+def test_causal_session_reads_its_own_writes(connection, accounts_service, user):
+    with connection.start_causal_session() as session:
+        account_id, account_number = accounts_service.create_account(
+            100, "Checking", "ada", str(user["_id"]), session=session)
+        by_number = accounts_service.get_account_by_number(account_number, session=session)
+        for_user = accounts_service.get_accounts_for_user("ada", session=session)
+
+    assert session.options.causal_consistency
+    assert by_number.id == account_id
+    assert [account.id for account in for_user] == [account_id]
+
+    # Every write and read of the flow ran in the session, on the primary,
+    # not on the bulk collections routed with the secondary read preference
+    flow_calls = [call for call in connection.calls if call.collection in ("accounts", "users")]
+    assert flow_calls
+    assert all(call.session is session for call in flow_calls)
+    assert all(call.read_preference is None for call in flow_calls)
+
+
+def test_bulk_lists_use_the_bulk_read_preference(connection, accounts_service):
+    accounts_service.get_active_accounts()
+
+    (call,) = connection.calls
+    assert call.read_preference is not None
+    assert call.session is None
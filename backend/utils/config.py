@@ -0,0 +1,28 @@
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def parse_route_map(value: str, cast: Callable[[str], T]) -> dict[str, T]:
+    """Parse a per-route setting of the form "/route-a=value,/route-b=value".
+
+    Args:
+        value (str): The raw setting, usually read from an environment variable.
+        cast (Callable[[str], T]): Converts each value, e.g. float or int.
+
+    Returns:
+        dict[str, T]: The values keyed by route path.
+
+    Raises:
+        ValueError: If an entry is malformed or a value cannot be converted.
+    """
+    routes = {}
+    for entry in (value or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        route, sep, raw = entry.partition("=")
+        if not sep or not route.strip():
+            raise ValueError(f"Invalid route setting '{entry}', expected '/route=value'")
+        routes[route.strip()] = cast(raw.strip())
+    return routes
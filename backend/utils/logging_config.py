@@ -0,0 +1,111 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Route of the request being handled, set by middleware.request_route
+request_route: ContextVar[Optional[str]] = ContextVar("request_route", default=None)
+
+_listener: Optional[QueueListener] = None
+
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        route = getattr(record, "route", None)
+        if route:
+            entry["route"] = route
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RouteSamplingFilter(logging.Filter):
+    """Keep only a sample of routine (INFO and below) records, per route.
+
+    Warnings and errors always pass. Records emitted outside a request use the default rate.
+    """
+
+    def __init__(self, default_rate: float = 1.0, route_rates: Optional[dict[str, float]] = None):
+        super().__init__()
+        self.default_rate = default_rate
+        self.route_rates = route_rates or {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        route = request_route.get()
+        record.route = route
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.route_rates.get(route, self.default_rate)
+        return rate >= 1.0 or random.random() < rate
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The stock QueueHandler formats each record in the calling thread; here the record is
+    enqueued as-is, so %-style arguments are only interpolated in the background.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(level: int = logging.INFO, default_sample_rate: float = 1.0,
+                  route_sample_rates: Optional[dict[str, float]] = None) -> None:
+    """Configure the root logger with a non-blocking, queue-based JSON pipeline.
+
+    Records are sampled and enqueued in the calling thread; a background QueueListener
+    formats them and writes them to stdout. Calling this again has no effect.
+
+    Args:
+        level (int): The root log level. Defaults to logging.INFO.
+        default_sample_rate (float): Fraction of routine records kept for routes without a rate.
+        route_sample_rates (Optional[dict[str, float]]): Fraction of routine records kept per route.
+
+    Returns:
+        None
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RouteSamplingFilter(default_sample_rate, route_sample_rates))
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    # uvicorn configures its loggers with their own stream handlers before importing
+    # the app; send their records through the queue too
+    for name in UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        for handler in list(uvicorn_logger.handlers):
+            uvicorn_logger.removeHandler(handler)
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)